@@ -0,0 +1,155 @@
+"""
+Headless benchmark of voice activity detection, capture-to-transcript latency and playback scheduling.
+
+Replays a recording through the Transcriber with the WAV replay backend, and plays synthesized speech through the null
+backend, both faster than real time, against the mock OpenAI server. Audio timings are reported in seconds of audio,
+so they don't depend on the replay speed. Run from the repository root with:
+
+    python -m benchmarks.audio_pipeline_benchmark --wav recording.wav --speed 20
+
+Without --wav, a synthetic recording of tones separated by pauses is used.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtCore import QCoreApplication
+
+from benchmarks.latency_benchmark import summarise
+from benchmarks.mock_openai_server import MockConfig, MockOpenAIServer
+from utils.audio_backends import NullBackend, WavReplayBackend, read_wav
+from utils.settings_manager import SettingsManager
+
+
+def synthetic_recording(samplerate, phrases=3, phrase_seconds=2.0, pause_seconds=1.0, lead_seconds=0.5):
+    """Returns tones standing in for spoken phrases, separated by pauses, with silence before them. The pauses are
+    long enough to cut a segment at, which takes the segment pause plus the hangover, but too short to end the
+    recording."""
+    phrase = 0.2 * np.sin(2 * np.pi * 220 * np.arange(int(phrase_seconds * samplerate)) / samplerate)
+    pause = np.zeros(int(pause_seconds * samplerate))
+    parts = [np.zeros(int(lead_seconds * samplerate))]
+    for _ in range(phrases):
+        parts += [phrase, pause]
+    return np.concatenate(parts[:-1]).astype(np.float32)
+
+
+def speech_end(recording, samplerate, threshold=0.01):
+    """Returns the position after the last sample louder than the threshold."""
+    loud = np.flatnonzero(np.abs(recording.reshape(len(recording), -1)).max(axis=1) > threshold)
+    return int(loud[-1]) + 1 if len(loud) else 0
+
+
+def benchmark_capture(recording, samplerate, speed, runs):
+    """Replays the recording into the Transcriber, measuring how long after the end of speech the recording stops,
+    and how long the rest of the transcript then takes."""
+    from models.transciber import Transcriber
+
+    transcriber = Transcriber(samplerate=samplerate, audio_backend=WavReplayBackend(recording, samplerate, speed=speed))
+    end_of_speech = speech_end(recording, samplerate)
+    detection_delays = []
+    transcript_latencies = []
+    segment_counts = []
+    for _ in range(runs):
+        # The same steps as Transcriber.record_and_transcribe, timing the point where recording stops
+        transcript = []
+        segments = []
+
+        def transcribe_in_background(audio_data):
+            segments.append(transcriber.segment_pool.submit(transcriber.transcribe_segment, audio_data, transcript))
+
+        remaining_audio = transcriber.record_audio(segment_callback=transcribe_in_background)
+        stopped = time.perf_counter()
+        background_segments = len(segments)
+        if len(remaining_audio) or not segments:
+            transcribe_in_background(remaining_audio)
+        for segment in segments:
+            segment.result()
+
+        transcript_latencies.append(time.perf_counter() - stopped)
+        detection_delays.append((transcriber.detector.position - end_of_speech) / samplerate)
+        segment_counts.append(background_segments)
+    return {
+        "end_of_speech_detection": summarise(detection_delays),  # In seconds of audio
+        "transcript_after_recording_stopped": summarise(transcript_latencies),
+        "segments_transcribed_while_recording": max(segment_counts)
+    }
+
+
+def benchmark_playback(sentences, speed, runs):
+    """Plays sentences through the SpeechGenerator into the null backend, measuring the time to the first audible
+    block and the silence between clips."""
+    from models.speech_generator import SAMPLE_RATE, SpeechGenerator
+
+    backend = NullBackend(speed=speed)
+    blocks = []  # (timestamp, whether the block was audible)
+    backend.add_hook(lambda event, timestamp, block: blocks.append((timestamp, any(block))))
+    speech_generator = SpeechGenerator(audio_backend=backend)
+    first_audio_times = []
+    gaps = []
+    for _ in range(runs):
+        blocks.clear()
+        start = time.perf_counter()
+        for sentence in sentences:
+            speech_generator.add_sentence(sentence)
+        time.sleep(0.05)
+        while speech_generator.is_playing_audio or speech_generator.audio_queue or speech_generator.sentence_queue:
+            time.sleep(0.01)
+
+        audible = [index for index, (_, is_audible) in enumerate(blocks) if is_audible]
+        if not audible:
+            continue
+        first_audio_times.append(blocks[audible[0]][0] - start)
+        silent_blocks = sum(1 for _, is_audible in blocks[audible[0]:audible[-1]] if not is_audible)
+        gaps.append(silent_blocks * backend.blocksize / SAMPLE_RATE)
+    speech_generator.shutdown()
+    return {
+        "time_to_first_audio": summarise(first_audio_times),
+        "silence_between_clips": summarise(gaps)  # In seconds of audio
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--wav", help="16-bit PCM WAV recording to replay, instead of the synthetic one")
+    parser.add_argument("--speed", type=float, default=20, help="Replay and playback speed, as a multiple of real time")
+    parser.add_argument("--speech-delay", type=float, default=0.2, help="Seconds before the first byte of speech")
+    parser.add_argument("--transcription-delay", type=float, default=0.4)
+    parser.add_argument("--output", help="Path to write the JSON report to, as well as printing it")
+    args = parser.parse_args()
+
+    if args.wav:
+        recording, samplerate = read_wav(args.wav)
+    else:
+        samplerate = 44100
+        recording = synthetic_recording(samplerate)
+    sentences = ["Good morning!", "You have three new emails.", "The first one is from your manager."]
+
+    config = MockConfig(speech_delay=args.speech_delay, transcription_delay=args.transcription_delay,
+                        speech_bytes_per_second=2_000_000 * args.speed)
+    app = QCoreApplication(sys.argv)  # Required by the Qt objects, but its event loop is never run
+
+    with MockOpenAIServer(config) as server:
+        # Point every client at the mock server, without saving the settings file
+        SettingsManager().settings.update({"api_key": "mock", "api_base_url": server.base_url,
+                                           "speech_cache_enabled": False, "speech_gap_ms": 0})
+        report = {
+            "runs": args.runs,
+            "speed": args.speed,
+            "recording_seconds": len(recording) / samplerate,
+            "capture": benchmark_capture(recording, samplerate, args.speed, args.runs),
+            "playback": benchmark_playback(sentences, args.speed, args.runs)
+        }
+
+    output = json.dumps(report, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
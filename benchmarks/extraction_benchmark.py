@@ -0,0 +1,98 @@
+"""
+Benchmark of main-content extraction for the webpage tool, on the saved pages in benchmarks/pages.
+
+Compares the previous path, BeautifulSoup's html.parser backend with get_text and every link on the page, against
+ContentExtractor fed in chunks as it would be while downloading, with html.parser and, if it is installed, lxml.
+Reports the median parse time and the size of the result the model would be given, and checks that each page's
+article text is kept and its boilerplate dropped. Run from the repository root with:
+
+    python -m benchmarks.extraction_benchmark --runs 20
+
+Saved pages of your own can be measured with --pages, in which case the content checks are skipped.
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from utils.content_extractor import ContentExtractor, etree
+from utils.http_client import CHUNK_SIZE
+from utils.tool_results import compact_json
+
+PAGES_DIRECTORY = Path(__file__).parent / "pages"
+# A sentence from each page's main content, and a piece of its boilerplate
+CHECKS = {
+    "news_article.html": ("Councillors voted 31 to 12 in favour", "Accept all cookies"),
+    "documentation.html": ("Only a connect timeout guarantees", "Sessions and connection pooling"),
+    "blog_with_comments.html": ("Dropping the starter from 20% to 12%", "Leave a Reply")
+}
+
+
+def extract_with_beautifulsoup(data, url):
+    """The previous WebpageHandler.get_content, without the request."""
+    soup = BeautifulSoup(data, 'html.parser')
+    text_content = soup.get_text(separator='\n', strip=True)
+    links = [{'name': a.get_text(strip=True), 'url': a.get('href')} for a in soup.find_all('a', href=True)]
+    return {'text': text_content, 'links': links}
+
+
+def extract_with_extractor(data, url, use_lxml):
+    extractor = ContentExtractor(url, use_lxml=use_lxml)
+    extractor.start(url, {"Content-Type": "text/html"})
+    for start in range(0, len(data), CHUNK_SIZE):
+        extractor.feed(data[start:start + CHUNK_SIZE])
+    return extractor.result()
+
+
+def measure(extract, data, url, runs):
+    """Returns the median time to extract a page, and the result."""
+    times = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = extract(data, url)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--pages", default=str(PAGES_DIRECTORY), help="Directory of saved .html pages")
+    parser.add_argument("--output", help="Path to write the JSON report to, as well as printing it")
+    args = parser.parse_args()
+
+    extractors = {
+        "beautifulsoup": extract_with_beautifulsoup,
+        "extractor_html_parser": lambda data, url: extract_with_extractor(data, url, use_lxml=False)
+    }
+    if etree is not None:
+        extractors["extractor_lxml"] = lambda data, url: extract_with_extractor(data, url, use_lxml=True)
+
+    report = {"runs": args.runs, "lxml_installed": etree is not None, "pages": {}}
+    for path in sorted(Path(args.pages).glob("*.html")):
+        data = path.read_bytes()
+        url = f"https://example.com/{path.name}"
+        page_report = {"page_bytes": len(data)}
+        for name, extract in extractors.items():
+            ms, result = measure(extract, data, url, args.runs)
+            output = compact_json(result)
+            page_report[name] = {"ms": ms, "output_chars": len(output), "links": len(result["links"])}
+            if path.name in CHECKS:
+                kept, dropped = CHECKS[path.name]
+                page_report[name]["keeps_main_text"] = kept in output
+                page_report[name]["drops_boilerplate"] = dropped not in output
+        report["pages"][path.name] = page_report
+
+    output = json.dumps(report, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == '__main__':
+    main()
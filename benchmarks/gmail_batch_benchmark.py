@@ -0,0 +1,149 @@
+"""
+Round trip benchmark for GmailClient.read_emails.
+
+Builds the Gmail service from the discovery document bundled with googleapiclient, on top of a mock HTTP object in the
+style of googleapiclient.http.HttpMockSequence. The mock answers list, get and batch requests from generated messages,
+sleeping for a fixed latency per round trip. Reports round trips and time for batched reads against one get per
+message. Run from the repository root with:
+
+    python -m benchmarks.gmail_batch_benchmark --latency 0.05
+"""
+import argparse
+import base64
+import json
+import re
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import httplib2
+from googleapiclient.discovery import build
+
+from integrations.gmail import GmailClient
+from utils.settings_manager import SettingsManager
+
+SIZES = [5, 50, 500]
+
+
+def generate_message(message_id, message_format):
+    """Returns a message resource as the Gmail API would, with a plain text part unless only metadata was asked for."""
+    headers = [{"name": "Subject", "value": f"Message {message_id}"}, {"name": "From", "value": "sender@example.com"}]
+    payload = {"mimeType": "multipart/alternative", "headers": headers}
+    if message_format != "metadata":
+        text = base64.urlsafe_b64encode((f"Body of message {message_id}. " * 40).encode()).decode()
+        html = base64.urlsafe_b64encode((f"<p>Body of message {message_id}.</p>" * 40).encode()).decode()
+        payload["parts"] = [{"mimeType": "text/plain", "body": {"data": text}},
+                            {"mimeType": "text/html", "body": {"data": html}}]
+    return {"id": message_id, "threadId": message_id, "payload": payload}
+
+
+class MockGmailHttp:
+    """An httplib2.Http stand-in that answers Gmail list, get and batch requests, counting round trips and bytes.
+    Gets in a batch for the message ids in `rate_limited` are answered with a 429 as many times as their count."""
+
+    def __init__(self, message_count, latency, rate_limited=None):
+        self.message_ids = [f"{index:016x}" for index in range(message_count)]
+        self.latency = latency
+        self.rate_limited = dict(rate_limited or {})
+        self.round_trips = 0
+        self.response_bytes = 0
+        self.gets = []  # (message id, format) of every get request, including those in batches
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        if urlparse(uri).path.startswith("/batch"):
+            content_type, content = self.batch(headers["content-type"], body)
+        else:
+            content_type, content = "application/json", json.dumps(self.answer(uri)).encode()
+        self.response_bytes += len(content)
+        return httplib2.Response({"status": "200", "content-type": content_type}), content
+
+    def answer(self, uri):
+        """Returns the JSON answer to a single list or get request."""
+        url = urlparse(uri)
+        query = parse_qs(url.query)
+        path = url.path.rstrip("/")
+        if path.endswith("/messages"):
+            start = int(query.get("pageToken", ["0"])[0])
+            end = start + int(query.get("maxResults", ["100"])[0])
+            answer = {"messages": [{"id": message_id} for message_id in self.message_ids[start:end]]}
+            if end < len(self.message_ids):
+                answer["nextPageToken"] = str(end)
+            return answer
+        message_id, message_format = path.rsplit("/", 1)[1], query.get("format", ["full"])[0]
+        self.gets.append((message_id, message_format))
+        return generate_message(message_id, message_format)
+
+    def batch(self, content_type, body):
+        """Answers a multipart/mixed batch request with one part per embedded request."""
+        body = body.decode() if isinstance(body, bytes) else body
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1)
+        response_boundary = uuid.uuid4().hex
+        parts = []
+        for part in body.split("--" + boundary)[1:-1]:
+            content_id = re.search(r"Content-ID: <(.+?)>", part, re.IGNORECASE).group(1)
+            request_line = re.search(r"^(GET|POST) (\S+) HTTP/1.1", part, re.MULTILINE)
+            uri = "https://gmail.googleapis.com" + request_line.group(2)
+            message_id = urlparse(uri).path.rsplit("/", 1)[1]
+            if self.rate_limited.get(message_id):
+                self.rate_limited[message_id] -= 1
+                self.gets.append((message_id, None))
+                status = "429 Too Many Requests"
+                payload = json.dumps({"error": {"code": 429, "message": "Rate limit exceeded"}})
+            else:
+                status = "200 OK"
+                payload = json.dumps(self.answer(uri))
+            parts.append(f"--{response_boundary}\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{content_id}>\r\n\r\n"
+                         f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                         f"{payload}\r\n")
+        content = "".join(parts) + f"--{response_boundary}--\r\n"
+        return f"multipart/mixed; boundary={response_boundary}", content.encode()
+
+
+def read_one_by_one(service, max_results):
+    """Reads emails the way read_emails did before batching: a list request, then one full get per message."""
+    results = service.users().messages().list(userId='me', labelIds=['INBOX'], maxResults=max_results).execute()
+    return [GmailClient.parse_message(service.users().messages().get(userId='me', id=message['id'], format='full').execute())
+            for message in results.get('messages', [])]
+
+
+def measure(size, latency, read):
+    """Runs a read against a fresh mock, returning its round trips, response bytes and time."""
+    http = MockGmailHttp(size, latency)
+    service = build("gmail", "v1", http=http, static_discovery=True)
+    start = time.perf_counter()
+    emails = read(service)
+    elapsed = time.perf_counter() - start
+    assert len(emails) == size, f"Read {len(emails)} of {size} emails"
+    return {"round_trips": http.round_trips, "response_bytes": http.response_bytes, "ms": elapsed * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds each round trip takes")
+    parser.add_argument("--output", help="Path to write the JSON report to, as well as printing it")
+    args = parser.parse_args()
+    SettingsManager().settings["gmail_mirror_enabled"] = False  # Measure the API reads, not the local mirror
+
+    report = {"latency": args.latency, "results": {}}
+    for size in SIZES:
+        def read_batched(service, headers_only=False):
+            return GmailClient(service=service).read_emails(max_results=size, headers_only=headers_only)
+
+        report["results"][size] = {
+            "one_by_one": measure(size, args.latency, lambda service: read_one_by_one(service, size)),
+            "batched": measure(size, args.latency, read_batched),
+            "batched_headers_only": measure(size, args.latency, lambda service: read_batched(service, True))
+        }
+
+    output = json.dumps(report, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == '__main__':
+    main()
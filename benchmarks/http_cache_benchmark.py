@@ -0,0 +1,151 @@
+"""
+Benchmark of the pooled, cached HttpClient used by WebpageHandler.
+
+Serves pages from a local http.server with different caching headers: a max-age page, a no-cache page with an ETag,
+a page with only Last-Modified, and a no-store page. Each page is fetched repeatedly with bare requests.get, as
+WebpageHandler did before, and with HttpClient, and the report compares the time, requests, connections and bytes
+the server saw, along with the cache's counters. The caching behaviour and the total timeout are checked by
+tests/test_http_client.py, against the same server. Run from the repository root with:
+
+    python -m benchmarks.http_cache_benchmark --latency 0.05 --fetches 10
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from utils.http_cache import HttpCache
+from utils.http_client import HttpClient
+
+PAGE = ("<html><body>" + "<p>Some page content that is the same on every fetch.</p>" * 2000 + "</body></html>").encode()
+LAST_MODIFIED = formatdate(time.time() - 7 * 24 * 60 * 60, usegmt=True)
+PAGES = {
+    "/max-age": {"Cache-Control": "max-age=3600"},
+    "/etag": {"Cache-Control": "no-cache", "ETag": '"page-v1"'},
+    "/last-modified": {"Cache-Control": "max-age=0", "Last-Modified": LAST_MODIFIED},
+    "/no-store": {"Cache-Control": "no-store"}
+}
+
+
+class PageServer(ThreadingHTTPServer):
+    """Serves PAGES over keep-alive connections, counting the requests, connections and body bytes it sends."""
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {"requests": 0, "connections": 0, "not_modified": 0, "body_bytes": 0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    def process_request_thread(self, request, client_address):
+        self.count("connections")
+        super().process_request_thread(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive, so reuse can be counted
+
+    def do_GET(self):
+        self.server.count("requests")
+        time.sleep(self.server.latency)
+        if self.path == "/slow":
+            self.trickle()
+            return
+        headers = PAGES.get(self.path)
+        if headers is None:
+            self.send_error(404)
+            return
+
+        not_modified = (headers.get("ETag") and self.headers.get("If-None-Match") == headers["ETag"]) or \
+                       (headers.get("Last-Modified") and self.headers.get("If-Modified-Since") == headers["Last-Modified"])
+        self.send_response(304 if not_modified else 200)
+        self.send_header("Date", formatdate(usegmt=True))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if not_modified:
+            self.server.count("not_modified")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+        self.server.count("body_bytes", len(PAGE))
+
+    def trickle(self):
+        """Sends a byte every 0.2 seconds, which never trips a read timeout but never finishes either."""
+        self.send_response(200)
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+        try:
+            for _ in range(1000):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.2)
+        except OSError:
+            pass  # The client gave up
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(server, fetch, url, fetches):
+    """Fetches a URL repeatedly, returning the time taken and what the server saw."""
+    server.reset()
+    start = time.perf_counter()
+    for _ in range(fetches):
+        fetch(url)
+    elapsed = time.perf_counter() - start
+    return {"ms": elapsed * 1000, **server.counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the server waits before each response")
+    parser.add_argument("--fetches", type=int, default=10, help="Fetches of each page")
+    parser.add_argument("--output", help="Path to write the JSON report to, as well as printing it")
+    args = parser.parse_args()
+
+    server = PageServer(args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    report = {"latency": args.latency, "fetches": args.fetches, "page_bytes": len(PAGE), "pages": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for path in PAGES:
+            client = HttpClient(cache=HttpCache(directory + path))
+            report["pages"][path] = {
+                "requests_get": measure(server, lambda url: requests.get(url).content, server.base_url + path,
+                                        args.fetches),
+                "http_client": measure(server, lambda url: client.get(url).content, server.base_url + path,
+                                       args.fetches),
+                "cache": client.stats()
+            }
+            client.session.close()
+    server.shutdown()
+
+    output = json.dumps(report, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Headless latency benchmark for the response, speech and transcription pipeline.
+
+Starts the mock OpenAI server, points the shared OpenAI clients at it and drives ResponseGenerator, SpeechGenerator
+and Transcriber without a window or audio device. Reports percentile latencies and throughput as JSON, so regressions
+can be tracked without network access. Run from the repository root with:
+
+    python -m benchmarks.latency_benchmark --runs 20 --output bench.json
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+
+import numpy as np
+from PyQt5.QtCore import QCoreApplication, Qt
+
+from benchmarks.mock_openai_server import MockConfig, MockOpenAIServer
+from enums import Role
+from models.speech_generator import AudioClip
+from utils.settings_manager import SettingsManager
+from utils.tool_registry import ToolRegistry, tool
+
+# A reply whose first sentence is long, to measure the early first clause
+LONG_OPENING_TEXT = ("I had a look through everything in your inbox from this morning, including the three threads you "
+                     "starred yesterday and the newsletter from the design team, and only one of them needs a reply "
+                     "before lunch. It's from your manager, about moving the meeting to ten o'clock.")
+
+
+def summarise(samples):
+    """Returns percentile statistics, in milliseconds, for a list of durations in seconds."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "min": ordered[0] * 1000,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": ordered[-1] * 1000
+    }
+
+
+class TurnRecorder:
+    """Records the timings of one assistant turn from the ResponseGenerator's signals, synthesizing each sentence as it arrives."""
+
+    def __init__(self, speech_generator):
+        self.speech_generator = speech_generator
+        self.synthesis_pool = ThreadPoolExecutor(max_workers=speech_generator.lookahead)  # Same look-ahead as the SpeechGenerator
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.start = None
+        self.first_sentence = None
+        self.first_audio = None
+        self.end = None
+        self.sentences = 0
+        self.characters = 0
+
+    def begin(self):
+        self.start = time.perf_counter()
+
+    def on_sentence(self, sentence, turn=0):
+        with self.lock:
+            if self.first_sentence is None:
+                self.first_sentence = time.perf_counter()
+            self.sentences += 1
+            self.characters += len(sentence)
+        self.synthesis_pool.submit(self.synthesize, sentence)
+
+    def synthesize(self, sentence):
+        """Streams a sentence's audio, recording when its first bytes arrive, as that is when playback can start."""
+        clip = AudioClip(sentence)
+        reader = threading.Thread(target=self.speech_generator.synthesize, args=(clip,))
+        reader.start()
+        if clip.read() is not None:
+            with self.lock:
+                if self.first_audio is None:
+                    self.first_audio = time.perf_counter()
+        while clip.read() is not None:
+            pass
+        reader.join()
+
+    def on_finished(self):
+        self.end = time.perf_counter()
+        self.finished.set()
+
+    def wait(self):
+        """Waits for the turn and the synthesis of all its sentences to finish."""
+        self.finished.wait()
+        self.synthesis_pool.shutdown(wait=True)
+
+
+def run_turn(model, speech_generator, prompt):
+    """Runs one turn through the ResponseGenerator and returns its TurnRecorder."""
+    recorder = TurnRecorder(speech_generator)
+    model.new_data_signal.connect(recorder.on_sentence, Qt.DirectConnection)
+    model.finished_generating_signal.connect(recorder.on_finished, Qt.DirectConnection)
+    try:
+        recorder.begin()
+        model.get_response(prompt, Role.USER).result()
+        recorder.wait()
+    finally:
+        model.new_data_signal.disconnect(recorder.on_sentence)
+        model.finished_generating_signal.disconnect(recorder.on_finished)
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Turns to run for each measurement")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Seconds before the first chat token")
+    parser.add_argument("--speech-delay", type=float, default=0.2, help="Seconds before the first byte of speech")
+    parser.add_argument("--transcription-delay", type=float, default=0.4)
+    parser.add_argument("--tool-delay", type=float, default=0.5, help="Seconds the benchmark tool takes to run")
+    parser.add_argument("--recording-seconds", type=float, default=5, help="Length of the audio sent for transcription")
+    parser.add_argument("--output", help="Path to write the JSON report to, as well as printing it")
+    args = parser.parse_args()
+
+    config = MockConfig(tokens_per_second=args.tokens_per_second, first_token_delay=args.first_token_delay,
+                        speech_delay=args.speech_delay, transcription_delay=args.transcription_delay)
+    app = QCoreApplication(sys.argv)  # Required by the Qt objects, but its event loop is never run
+
+    with MockOpenAIServer(config) as server:
+        # Point every client at the mock server, without saving the settings file
+        SettingsManager().settings.update({"api_key": "mock", "api_base_url": server.base_url,
+                                           "response_cache_enabled": False, "speech_cache_enabled": False})
+        from models.response_generator import ResponseGenerator
+        from models.speech_generator import SpeechGenerator
+        from models.transciber import Transcriber
+
+        @tool("Benchmark tool that waits before returning.")
+        def benchmark_tool(query: Annotated[str, "Anything"]):
+            time.sleep(args.tool_delay)
+            return f"Results for {query}"
+
+        tools = ToolRegistry()
+        tools.register(benchmark_tool)
+        model = ResponseGenerator(functions=tools.schemas, function_handler=tools.call)
+        speech_generator = SpeechGenerator()
+        transcriber = Transcriber()
+
+        plain_turns = [run_turn(model, speech_generator, "Tell me about my day.") for _ in range(args.runs)]
+        tool_turns = [run_turn(model, speech_generator, f"Please {config.tool_trigger}.") for _ in range(args.runs)]
+
+        # Time to first audio with the early first clause off and on, for a reply with a long opening sentence
+        default_response_text = config.response_text
+        config.response_text = LONG_OPENING_TEXT
+        first_clause_turns = {}
+        for enabled in (False, True):
+            model.segmenter.first_clause = enabled
+            model.segmenter.reset()
+            first_clause_turns[enabled] = [run_turn(model, speech_generator, "Anything urgent?") for _ in range(args.runs)]
+        config.response_text = default_response_text
+
+        transcription_times = []
+        encode_times = []
+        audio = np.zeros((int(transcriber.samplerate * args.recording_seconds), transcriber.channels), dtype=np.float32)
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            transcriber.transcribe_audio(audio)
+            transcription_times.append(time.perf_counter() - start)
+            encode_times.append(transcriber.encode_time)
+
+        model.shutdown()
+        upload_sizes = [size for path, size in server.requests if path.endswith("/audio/transcriptions")]
+
+    plain_totals = [turn.end - turn.start for turn in plain_turns]
+    tool_totals = [turn.end - turn.start for turn in tool_turns]
+    mean_plain_total = sum(plain_totals) / len(plain_totals)
+    first_audio_off = [turn.first_audio - turn.start for turn in first_clause_turns[False]]
+    first_audio_on = [turn.first_audio - turn.start for turn in first_clause_turns[True]]
+    report = {
+        "config": vars(config),
+        "runs": args.runs,
+        "metrics": {
+            "time_to_first_sentence": summarise([turn.first_sentence - turn.start for turn in plain_turns]),
+            "time_to_first_audio": summarise([turn.first_audio - turn.start for turn in plain_turns]),
+            "total_turn_time": summarise(plain_totals),
+            "tool_turn_time": summarise(tool_totals),
+            # Time a tool turn takes beyond a plain turn and the tool itself, the cost of the extra round trip
+            "tool_call_overhead": summarise([total - mean_plain_total - args.tool_delay for total in tool_totals]),
+            "transcription_time": summarise(transcription_times),
+            "transcription_encode_time": summarise(encode_times)
+        },
+        "first_clause_flush": {
+            "time_to_first_audio_off": summarise(first_audio_off),
+            "time_to_first_audio_on": summarise(first_audio_on),
+            "mean_improvement": (sum(first_audio_off) / len(first_audio_off) - sum(first_audio_on) / len(first_audio_on)) * 1000
+        },
+        "throughput": {
+            "characters_per_second": sum(turn.characters for turn in plain_turns) / sum(plain_totals),
+            "sentences_per_second": sum(turn.sentences for turn in plain_turns) / sum(plain_totals)
+        },
+        "transcription_upload_bytes": max(upload_sizes) if upload_sizes else None
+    }
+    output = json.dumps(report, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+A local stand-in for the OpenAI chat completions, speech and transcription endpoints, for benchmarking without network
+access. Token rates, delays and response contents are configurable through MockConfig.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockConfig:
+    """Settings for the mock server. Delays are in seconds."""
+
+    def __init__(self, **overrides):
+        self.response_text = ("Good morning! You have three new emails, and the first one is from your manager. "
+                              "She says the meeting has moved to ten o'clock, so you have a little more time. "
+                              "Would you like me to read the other two?")
+        self.tokens_per_second = 50  # Streamed chat tokens, one word each
+        self.first_token_delay = 0.3  # Time before the first chat token
+        self.tool_trigger = "use the tool"  # User messages containing this are answered with a tool call
+        self.tool_name = "benchmark_tool"
+        self.tool_arguments = '{"query": "benchmark"}'
+        self.speech_delay = 0.2  # Time before the first byte of synthesized audio
+        self.speech_bytes_per_character = 2000  # Roughly 24 kHz 16-bit PCM at a normal speaking rate
+        self.speech_bytes_per_second = 2_000_000
+        self.transcription_delay = 0.4
+        self.transcription_text = "Check my email and tell me about anything urgent."
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise AttributeError(f"Unknown mock setting: {name}")
+            setattr(self, name, value)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive, like the real API
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.record_request(self.path, len(body))
+        if self.path.endswith("/chat/completions"):
+            self.chat_completions(json.loads(body))
+        elif self.path.endswith("/audio/speech"):
+            self.speech(json.loads(body))
+        elif self.path.endswith("/audio/transcriptions"):
+            self.transcriptions()
+        else:
+            self.send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, data):
+        """Writes one piece of a chunked transfer encoded response."""
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def chat_completions(self, request):
+        messages = request.get("messages", [])
+        last_message = messages[-1] if messages else {}
+        call_tool = (request.get("tools") and last_message.get("role") == "user"
+                     and self.config.tool_trigger in (last_message.get("content") or ""))
+
+        if not request.get("stream"):
+            # Non-streamed requests are only used for summaries, so answer them with plain text
+            time.sleep(self.config.first_token_delay)
+            self.send_json({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.config.response_text}}]
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_delta(delta, finish_reason=None):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model"),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        time.sleep(self.config.first_token_delay)
+        if call_tool:
+            send_delta({"role": "assistant", "content": None, "tool_calls": [{
+                "index": 0, "id": "call_mock", "type": "function",
+                "function": {"name": self.config.tool_name, "arguments": ""}}]})
+            for piece in re.findall(r".{1,8}", self.config.tool_arguments):
+                time.sleep(1 / self.config.tokens_per_second)
+                send_delta({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]})
+            send_delta({}, "tool_calls")
+        else:
+            send_delta({"role": "assistant", "content": ""})
+            for token in re.findall(r"\s*\S+", self.config.response_text):
+                send_delta({"content": token})
+                time.sleep(1 / self.config.tokens_per_second)
+            send_delta({}, "stop")
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def speech(self, request):
+        size = len(request.get("input", "")) * self.config.speech_bytes_per_character
+        time.sleep(self.config.speech_delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        piece_size = 4096
+        for start in range(0, size, piece_size):
+            piece = b"\x10\x00" * (min(piece_size, size - start) // 2)  # A quiet constant level, distinguishable from silence
+            self.wfile.write(piece)
+            time.sleep(len(piece) / self.config.speech_bytes_per_second)
+
+    def transcriptions(self):
+        time.sleep(self.config.transcription_delay)
+        self.send_json({"text": self.config.transcription_text})
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """A threaded mock API server. Use as a context manager to run it in the background."""
+    daemon_threads = True
+
+    def __init__(self, config=None, port=0):
+        super().__init__(("127.0.0.1", port), MockOpenAIHandler)
+        self.config = config or MockConfig()
+        self.lock = threading.Lock()
+        self.requests = []  # (path, request body size in bytes) of every POST request
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def record_request(self, path, size):
+        with self.lock:
+            self.requests.append((path, size))
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    with MockOpenAIServer(port=8765) as server:
+        print(f"Mock OpenAI server running at {server.base_url}")
+        threading.Event().wait()
@@ -0,0 +1,121 @@
+"""
+Micro-benchmark for the streaming sentence segmenter.
+
+Compares SentenceSegmenter against the previous buffer-rescanning implementation on large synthetic streams,
+chunked the way the chat completions API streams tokens. Run from the repository root with:
+
+    python -m benchmarks.sentence_segmenter_benchmark
+"""
+import argparse
+import random
+import re
+import time
+
+from models.sentence_segmenter import SentenceSegmenter
+
+WORDS = ["the", "assistant", "opened", "your", "inbox", "and", "found", "three", "new", "messages", "from", "work",
+         "about", "tomorrow's", "meeting", "schedule", "which", "was", "moved", "to", "ten"]
+
+
+class LegacySegmenter:
+    """The previous implementation from ResponseGenerator.emit_complete_sentences, kept for comparison."""
+
+    def __init__(self):
+        self.sentence_buffer = ""
+
+    def feed(self, content):
+        self.sentence_buffer += content
+        sentences = []
+        while True:
+            quote_indices = [m.start() for m in re.finditer('"', self.sentence_buffer)]
+
+            if len(quote_indices) >= 2:
+                second_quote_index = quote_indices[1]
+                quoted_sentence = self.sentence_buffer[:second_quote_index + 1].strip()
+                self.sentence_buffer = self.sentence_buffer[second_quote_index + 1:].strip()
+                if quoted_sentence:
+                    sentences.append(quoted_sentence)
+                    continue
+
+            pattern = re.compile(r'(?<=[.!?])\s+')
+            match = pattern.search(self.sentence_buffer)
+            if match:
+                sentence_end = match.start() + 1
+                complete_sentence = self.sentence_buffer[:sentence_end].strip()
+                quote_indices = [m.start() for m in re.finditer('"', complete_sentence)]
+                if complete_sentence and len(quote_indices) == 0:
+                    self.sentence_buffer = self.sentence_buffer[sentence_end:].strip()
+                    sentences.append(complete_sentence)
+                else:
+                    break
+            else:
+                break
+        return sentences
+
+    def flush(self):
+        remainder = self.sentence_buffer.strip()
+        self.sentence_buffer = ""
+        return remainder or None
+
+
+def generate_prose(characters, seed):
+    """Returns tokens of synthetic prose with sentences of varying length and the occasional quote."""
+    rng = random.Random(seed)
+    tokens = []
+    length = 0
+    while length < characters:
+        sentence = [rng.choice(WORDS) for _ in range(rng.randint(4, 30))]
+        if rng.random() < 0.1:
+            sentence[1] = '"' + sentence[1]
+            sentence[-2] = sentence[-2] + '"'
+        sentence[-1] += rng.choice(".!?")
+        for word in sentence:
+            tokens.append(" " + word)  # Streamed tokens usually carry the preceding space
+            length += len(word) + 1
+    return tokens
+
+
+def generate_unpunctuated(characters, seed):
+    """Returns tokens of one long sentence with no punctuation, the worst case for the previous implementation."""
+    rng = random.Random(seed)
+    tokens = []
+    length = 0
+    while length < characters:
+        word = rng.choice(WORDS)
+        tokens.append(" " + word)
+        length += len(word) + 1
+    return tokens
+
+
+def run(segmenter, tokens):
+    """Feeds every token through a segmenter, returning the sentences and the time taken in seconds."""
+    sentences = []
+    start = time.perf_counter()
+    for token in tokens:
+        sentences.extend(segmenter.feed(token))
+    remainder = segmenter.flush()
+    elapsed = time.perf_counter() - start
+    if remainder:
+        sentences.append(remainder)
+    return sentences, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000],
+                        help="Stream lengths to test, in characters")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'stream':<14}{'characters':>12}{'legacy (ms)':>14}{'new (ms)':>12}{'speedup':>10}  same output")
+    for name, generate in (("prose", generate_prose), ("unpunctuated", generate_unpunctuated)):
+        for size in args.sizes:
+            tokens = generate(size, args.seed)
+            legacy_sentences, legacy_time = run(LegacySegmenter(), tokens)
+            new_sentences, new_time = run(SentenceSegmenter(abbreviations=()), tokens)
+            print(f"{name:<14}{size:>12}{legacy_time * 1000:>14.1f}{new_time * 1000:>12.1f}"
+                  f"{legacy_time / new_time:>9.1f}x  {legacy_sentences == new_sentences}")
+
+
+if __name__ == '__main__':
+    main()
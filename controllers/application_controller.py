@@ -1,5 +1,6 @@
-import json
+import re
 import sys
+from typing import Annotated
 
 from PyQt5.QtCore import QThread, QMetaObject, Q_ARG, QTimer, Qt
 from PyQt5.QtWidgets import QApplication
@@ -7,36 +8,44 @@ from PyQt5.QtWidgets import QApplication
 from enums import *
 from models.assistant_mind import AssistantMind
 from models.response_generator import ResponseGenerator
-from utils import font_manager
+from utils import font_manager, openai_clients
+from utils.cancellation import CancellationToken
 from utils.settings_manager import SettingsManager
 from views.user_interface import MainWindow
 from models.speech_generator import SpeechGenerator
 from models.transciber import Transcriber
-from integrations.gmail import GmailClient
-from integrations.webpage_handler import WebpageHandler
-from integrations.file_handler import FileHandler
+from integrations import tools as integration_tools
+from utils.tool_registry import ToolRegistry, tool
+
+CANCEL_COMMANDS = {"stop", "cancel", "be quiet", "never mind", "nevermind", "stop talking"}
 
 
 class ApplicationController:
     def __init__(self):
         self.is_return_pressed_connected = True
+        self.recording = False  # Whether a recording from the voice button is running
+        self.responding = False  # Whether a response is being generated or spoken
+        self.listening_for_cancel = False  # Whether the current recording was started while the assistant was responding
         self.app = QApplication(sys.argv)
 
         self.view = MainWindow(self)
-        self.transcriber = Transcriber()
-        self.is_return_pressed_connected = True
 
         self.settings_manager = SettingsManager()
 
-        self.sentences = []
-        self.functions = self.init_functions()
+        self.cancel_token = CancellationToken()  # Cancels the current turn across generation, speech and playback
+        # Integration tools are registered without importing their integrations, which load on first use
+        self.tools = ToolRegistry(default_budget=self.settings_manager.get_setting("tool_result_budget", 1000))
+        self.tools.register_all(self)
+        self.tools.register_all(integration_tools)
 
-        self.model = ResponseGenerator(functions=self.functions)
+        # The ResponseGenerator runs on its own event loop thread, and calls the tools from its tool pool
+        self.model = ResponseGenerator(functions=self.tools.schemas, function_handler=self.tools.call,
+                                       cancel_token=self.cancel_token)
 
         # Thread creation
 
         self.speech_thread = QThread()
-        self.speech_generator = SpeechGenerator()
+        self.speech_generator = SpeechGenerator(cancel_token=self.cancel_token)
         self.speech_generator.moveToThread(self.speech_thread)
         self.speech_generator.finished.connect(self.display_message)
         self.speech_generator.start_speaking.connect(self.started_speaking)
@@ -44,12 +53,8 @@ class ApplicationController:
         self.speech_generator.finished_speaking.connect(self.enable_input)
         self.speech_thread.start()
 
-        self.input_thread = QThread()
-        self.model.moveToThread(self.input_thread)
         self.model.new_data_signal.connect(self.process_audio)
         self.model.start_generating_signal.connect(self.disable_input)
-        self.model.function_call.connect(self.process_function_call)
-        self.input_thread.start()
 
         self.brain_thread = QThread()
         self.assistantMind = AssistantMind()
@@ -60,14 +65,12 @@ class ApplicationController:
         self.transcriber_thread = QThread()
         self.transcriber = Transcriber()
         self.transcriber.moveToThread(self.transcriber_thread)
-        self.transcriber.transcription_complete.connect(self.process_input)
+        self.transcriber.transcription_complete.connect(self.process_transcription)
         self.transcriber_thread.start()
 
-        self.gmail_client = GmailClient()
-
-        self.webpage_fetcher = WebpageHandler()
-
-        self.file_handler = FileHandler()
+        # Open API connections now, so the first response, speech and transcription requests skip the TLS handshake
+        openai_clients.prewarm()
+        self.model.prewarm()
 
         QMetaObject.invokeMethod(self.assistantMind, 'start', Qt.AutoConnection)
 
@@ -77,18 +80,21 @@ class ApplicationController:
             # Disconnect only if it's currently connected
             self.view.userInput.returnPressed.disconnect(self.view.send_message)
             self.view.assistant_icon.animate_in()
+            self.view.stopButton.setVisible(True)
             self.is_return_pressed_connected = False
             return True
         elif not disconnect and not self.is_return_pressed_connected:
             # Reconnect only if it's currently disconnected
             self.view.userInput.returnPressed.connect(self.view.send_message)
             self.view.assistant_icon.animate_out()
+            self.view.stopButton.setVisible(False)
             self.is_return_pressed_connected = True
             return True
         return False
 
     def disable_input(self):
         """Called when response generation is started, disables input while generation is in progress"""
+        self.responding = True
         self.disable_text_input(True)
 
     def finished_speaking(self):
@@ -104,51 +110,95 @@ class ApplicationController:
         if self.speech_generator.is_playing_audio or self.speech_generator.sentence_queue or self.speech_generator.audio_queue:
             QTimer.singleShot(500, self.enable_input)
         else:
+            self.responding = False
             self.disable_text_input(False)
             QMetaObject.invokeMethod(self.assistantMind, 'input_enabled_event', Qt.AutoConnection)
 
+    def cancel(self):
+        """Cancels the current turn: aborts generation, drops queued speech and re-enables input straight away."""
+        self.cancel_token.cancel()
+        self.responding = False
+        self.finished_speaking()
+        self.disable_text_input(False)
+
+    @staticmethod
+    def is_cancel_command(user_input):
+        """Checks whether the user's input is a spoken or typed request to stop the assistant."""
+        return re.sub(r"[^a-z ]", "", user_input.lower()).strip() in CANCEL_COMMANDS
+
+    @staticmethod
+    def ends_with_cancel_command(transcript):
+        """Checks whether a transcript ends with a cancel command, as one recorded while the assistant is speaking
+        may start with the assistant's own speech."""
+        words = re.sub(r"[^a-z\s]", "", transcript.lower()).split()
+        longest = max(len(command.split()) for command in CANCEL_COMMANDS)
+        return any(" ".join(words[-length:]) in CANCEL_COMMANDS for length in range(1, min(len(words), longest) + 1))
+
     def generate_message(self, prompt):
         """Generate a message based on a system prompt"""
         # If input is already disabled, generation is currently in progress, therefore return
         if not self.disable_text_input(True):
             return
 
+        self.responding = True
         QMetaObject.invokeMethod(self.model, 'get_response', Q_ARG(str, prompt), Q_ARG(Role, Role.SYSTEM))
 
     def process_input(self, user_input, display_message=False):
         """Display the user's input and send it to the ResponseGenerator."""
+        if self.is_cancel_command(user_input):
+            self.cancel()
+            return
         self.disable_text_input(True)
         if display_message:
             self.view.display_message(user_input, Sender.USER)
+        self.responding = True
         QMetaObject.invokeMethod(self.model, 'get_response', Q_ARG(str, user_input), Q_ARG(Role, Role.USER))
 
     def process_audio_input(self):
         """Start transcribing audio from the microphone."""
-        if not self.disable_text_input(True):
-            return
-
-        QMetaObject.invokeMethod(self.transcriber, 'transcribe_from_microphone')
+        if self.recording:
+            return  # Already recording, and the recording ends by itself when the user stops speaking
+        self.recording = True
+        # While the assistant is responding, the recording is only listened to for a cancel command
+        self.listening_for_cancel = self.responding
         self.disable_text_input(True)
+        QMetaObject.invokeMethod(self.transcriber, 'transcribe_from_microphone')
 
-    def display_message(self):
-        """Display the next sentence in the conversation.
+    def process_transcription(self, transcript):
+        """Send a finished transcription on as the user's input. A recording made while the assistant was busy is
+        only checked for a cancel command, and otherwise thrown away, as it may have picked up the assistant's speech."""
+        self.recording = False
+        if self.listening_for_cancel:
+            self.listening_for_cancel = False
+            if self.ends_with_cancel_command(transcript):
+                self.cancel()
+            return
+        self.process_input(transcript)
+
+    def display_message(self, sentence):
+        """Display the sentence that is starting to be spoken, which may be several merged sentences or part of a long one.
         This method is connected to the finished signal from the SpeechGenerator."""
         self.view.assistant_icon.start_pulse_animation()
         if self.settings_manager.get_setting("assistant_chat_bubbles", True):
-            self.view.display_message(self.sentences.pop(0))
-        else:
-            self.sentences.pop(0)
+            self.view.display_message(sentence)
 
-    def process_audio(self, response):
-        """Process the response from the ResponseGenerator and send it to the SpeechGenerator."""
-        self.sentences.append(response)
+    def process_audio(self, response, turn):
+        """Process the response from the ResponseGenerator and send it to the SpeechGenerator.
+        Sentences from a turn that was cancelled while they were queued are dropped."""
+        if self.cancel_token.is_cancelled(turn):
+            return
         QMetaObject.invokeMethod(self.speech_generator, 'add_sentence',
-                                 Qt.QueuedConnection, Q_ARG(str, response))
+                                 Qt.QueuedConnection, Q_ARG(str, response), Q_ARG(int, turn))
 
     def cleanup(self):
         """Clean up threads when the application is closed."""
-        self.input_thread.quit()
-        self.input_thread.wait()
+        print(f"Connection pool usage: {openai_clients.pool_stats()}")
+        if self.speech_generator.speech_cache:
+            print(f"Speech cache: {self.speech_generator.speech_cache.stats()}")
+        if integration_tools.webpage_fetcher.instance:
+            print(f"HTTP cache: {integration_tools.webpage_fetcher.instance.client.stats()}")
+        self.model.shutdown()
+        self.speech_generator.shutdown()
         self.speech_thread.quit()
         self.speech_thread.wait()
 
@@ -163,196 +213,18 @@ class ApplicationController:
     # Function handling
     # =================
 
-    def init_functions(self):
-        """Initialize the functions that the assistant can perform."""
-        functions = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "continuous_responses",
-                    "description": "Enables or disables continuous responses - enabling you to continue generating responses at the specified interval",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "enabled": {
-                                "type": "boolean",
-                                "description": "Whether to continuously respond to the user."
-                            },
-                            "frequency": {
-                                "type": "integer",
-                                "description": "The frequency to respond to the user, in seconds."
-                            }
-                        },
-                        "required": ["enabled"]
-                    },
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_emails",
-                    "description": "Returns recent emails from the user's inbox.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "quantity": {
-                                "type": "integer",
-                                "description": "The number of emails to return"
-                            },
-                        },
-                        "required": ["quantity"]
-                    },
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "send_email",
-                    "description": "Sends an email on the users behalf.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "to": {
-                                "type": "string",
-                                "description": "The email address of the recipient"
-                            },
-                            "subject": {
-                                "type": "string",
-                                "description": "The subject line of the email"
-                            },
-                            "body": {
-                                "type": "string",
-                                "description": "The content of the email"
-                            },
-                        },
-                        "required": ["to", "subject", "body"]
-                    },
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_webpage_content",
-                    "description": "Returns the content of a webpage. If the user requests a google search, use duckduckgo instead. This should be called if you want to get information from a webpage.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "url": {
-                                "type": "string",
-                                "description": "The URL of the webpage"
-                            },
-                        },
-                        "required": ["url"]
-                    },
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "open_webpage",
-                    "description": "Opens a webpage in the users default browser. This should be called if the user wants to see a webpage.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "url": {
-                                "type": "string",
-                                "description": "The URL of the webpage"
-                            },
-                        },
-                        "required": ["url"]
-                    },
-                }
-            }
-            ,
-            {
-                "type": "function",
-                "function": {
-                    "name": "open_file",
-                    "description": "Opens a file in the default application.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "The path of the file"
-                            },
-                        },
-                        "required": ["file_path"]
-                    },
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_files_in_directory",
-                    "description": "Returns a list of files and dirs in a directory",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "dir_path": {
-                                "type": "string",
-                                "description": "The path of the directory"
-                            },
-                        },
-                        "required": ["file_path"]
-                    },
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "exit_program",
-                    "description": "Exits the desktop assistant program",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "dir_path": {
-                                "type": "string",
-                                "description": "The path of the directory"
-                            },
-                        },
-                        "required": []
-                    },
-                }
-            }
-        ]
-        return functions
-
-    def process_function_call(self, function_call, arg_string):
-        """Process a function call from the ResponseGenerator."""
-        try:
-            arguments = json.loads(arg_string)
-            return_string = ""
-            match function_call:
-                case "continuous_responses":  # Enables or disables continuous responses
-                    if arguments["enabled"]:
-                        QMetaObject.invokeMethod(self.assistantMind, 'set_continuous_responses'
-                                                 , Q_ARG(bool, arguments["enabled"]),
-                                                 Q_ARG(int, arguments["frequency"]))
-                        return_string = "Continuous responses " + (
-                            "enabled" if arguments["enabled"] else "disabled") + " at a frequency of " + str(
-                            arguments["frequency"]) + " seconds."
-                    else:
-                        QMetaObject.invokeMethod(self.assistantMind, 'set_continuous_responses'
-                                                 , Q_ARG(bool, arguments["enabled"]), Q_ARG(int, 0))
-                        return_string = "Continuous responses disabled."
-                case "get_emails":  # Returns the result of the read_emails function
-                    return_string = str(self.gmail_client.read_emails(max_results=arguments["quantity"]))
-                case "send_email":  # Sends an email
-                    self.gmail_client.send_email(arguments["to"], arguments["subject"], arguments["body"])
-                    return_string = "Email sent successfully."
-                case "get_webpage_content":  # Returns the content of a webpage
-                    return_string = self.webpage_fetcher.get_content(arguments["url"])
-                case "open_webpage":  # Opens a webpage in the default browser
-                    self.webpage_fetcher.open_link(arguments["url"])
-                    return_string = "Webpage opened successfully."
-                case "open_file":  # Opens a file using the default program
-                    return_string = self.file_handler.open_file_with_default_program(arguments["file_path"])
-                case "get_files_in_directory":  # Returns a list of files and directories in a directory
-                    return_string = str(self.file_handler.get_files_in_directory(arguments["dir_path"]))
-                case "exit_program":
-                    sys.exit()
-        except Exception as e:
-            return_string = str(e)
-        # Return the result of the function call to the ResponseGenerator
-        QMetaObject.invokeMethod(self.model, 'function_return', Q_ARG(str, return_string))
+    @tool("Enables or disables continuous responses - enabling you to continue generating responses at the specified interval")
+    def continuous_responses(self, enabled: Annotated[bool, "Whether to continuously respond to the user."],
+                             frequency: Annotated[int, "The frequency to respond to the user, in seconds."] = 0):
+        """Enables or disables continuous responses. Called from the ResponseGenerator's tool pool."""
+        QMetaObject.invokeMethod(self.assistantMind, 'set_continuous_responses',
+                                 Q_ARG(bool, enabled), Q_ARG(int, frequency if enabled else 0))
+        if enabled:
+            return "Continuous responses enabled at a frequency of " + str(frequency) + " seconds."
+        return "Continuous responses disabled."
+
+    @tool("Exits the desktop assistant program")
+    def exit_program(self):
+        """Exits the program. Runs on a worker thread, so the application is asked to quit rather than calling sys.exit()."""
+        QMetaObject.invokeMethod(self.app, 'quit', Qt.QueuedConnection)
+        return ""
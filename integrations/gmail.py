@@ -1,5 +1,7 @@
 import os.path
 import base64
+import threading
+import time
 from email.mime.text import MIMEText
 
 from google.auth.transport.requests import Request
@@ -8,15 +10,31 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from integrations.gmail_mirror import GmailMirror
+from utils.settings_manager import SettingsManager
+
+MAX_LIST_RESULTS = 500  # The most message ids one list request can return
+RETRYABLE_STATUSES = {429, 500, 503}  # Rate limited or temporarily unavailable, so worth one more try
+
+
 class GmailClient:
-    def __init__(self, credentials_path='config/secure/credentials.json', token_path='config/secure/token.json', scopes=None):
+    def __init__(self, credentials_path='config/secure/credentials.json', token_path='config/secure/token.json', scopes=None,
+                 service=None):
         self.credentials_path = credentials_path
         self.token_path = token_path
         self.scopes = scopes or ['https://www.googleapis.com/auth/gmail.readonly', 'https://www.googleapis.com/auth/gmail.send']
-        self.service = self.get_gmail_service()
+        self.service = service  # Loaded from the saved token on first use, if not given
+        self.lock = threading.Lock()  # The Gmail service is not thread safe, and tool calls can run concurrently
+        # Gets per batch request, which is also the most Gmail handles at once for us, to stay under its rate limits
+        settings_manager = SettingsManager()
+        self.batch_size = settings_manager.get_setting("gmail_batch_size", 50)
+        self.mirror_enabled = settings_manager.get_setting("gmail_mirror_enabled", True)
+        self.mirror_size = settings_manager.get_setting("gmail_mirror_size", 200)
+        self.mirror = None  # A local copy of recent mail, so reads and searches only fetch what changed
 
-    def get_gmail_service(self):
-        """If the gmail api credentials are provided, returns a Gmail service object, otherwise returns None."""
+    def get_gmail_service(self, authorize=False):
+        """If the gmail api credentials are provided, returns a Gmail service object, otherwise returns None.
+        The sign in flow, which waits for the user in a browser, is only run if authorize is set."""
         try:
             creds = None
             if os.path.exists(self.token_path):
@@ -24,15 +42,28 @@ class GmailClient:
             if not creds or not creds.valid:
                 if creds and creds.expired and creds.refresh_token:
                     creds.refresh(Request())
-                else:
+                elif authorize:
                     flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
                     creds = flow.run_local_server(port=0)
+                else:
+                    return None
                 with open(self.token_path, 'w') as token:
                     token.write(creds.to_json())
             return build('gmail', 'v1', credentials=creds)
         except Exception:
             return None
 
+    def connect(self):
+        """Loads the Gmail service from the saved token, if it isn't loaded yet. Tool calls run with a timeout in a
+        shared pool, so rather than waiting for the user to sign in, this raises an error if there is no valid token.
+        The lock must be held by the caller."""
+        if self.service is None:
+            self.service = self.get_gmail_service()
+            if self.service is None:
+                raise RuntimeError("Gmail is not signed in. The user can sign in by running: python -m integrations.gmail")
+        if self.mirror is None and self.mirror_enabled:
+            self.mirror = GmailMirror(self, size=self.mirror_size)
+
     def create_message(self, sender, to, subject, message_text):
         """Create a message for an email."""
         message = MIMEText(message_text)
@@ -46,50 +77,140 @@ class GmailClient:
         """Send an email message."""
         try:
             message = self.create_message('me', to, subject, body)
-            sent = self.service.users().messages().send(userId='me', body=message).execute()
+            with self.lock:
+                self.connect()
+                sent = self.service.users().messages().send(userId='me', body=message).execute()
             print(f"Message Id: {sent['id']}")
         except HttpError as error:
             print(f'An error occurred: {error}')
 
-    def read_emails(self, label_ids=['INBOX'], max_results=5):
-        """Returns a list of emails from the user's mailbox."""
-        try:
-            results = self.service.users().messages().list(userId='me', labelIds=label_ids, maxResults=max_results).execute()
-            messages = results.get('messages', [])
+    def read_emails(self, label_ids=['INBOX'], max_results=5, headers_only=False):
+        """Returns a list of emails from the user's mailbox. With headers_only, only the subject and sender are fetched."""
+        with self.lock:
+            self.connect()
+            try:
+                if self.mirror:
+                    self.mirror.sync()
+                    emails = self.mirror.read_emails(label_ids, max_results, headers_only)
+                    if len(emails) == max_results or self.mirror.complete:
+                        return emails
+                    # Asked for more than the mirror holds, so fall back to fetching them
+
+                message_ids = self.list_message_ids(label_ids, max_results)
+                if not message_ids:
+                    print("No messages found.")
+                    return []
+
+                messages = self.get_messages(message_ids, headers_only)
+                return [self.parse_message(messages[message_id]) for message_id in message_ids if message_id in messages]
 
-            if not messages:
-                print("No messages found.")
+            except HttpError as error:
+                print(f'An error occurred: {error}')
                 return []
 
-            emails = []
-            for message in messages:
-                msg = self.service.users().messages().get(userId='me', id=message['id'], format='full').execute()
+    def search_emails(self, query, max_results=5, headers_only=False):
+        """Returns the emails that best match a search query, from the mirror if there is one, or Gmail's search otherwise."""
+        with self.lock:
+            self.connect()
+            try:
+                if self.mirror:
+                    self.mirror.sync()
+                    emails = self.mirror.search(query, max_results, headers_only)
+                    if len(emails) == max_results or self.mirror.complete:
+                        return emails
+                    # Older messages outside the mirror may match too, so fall back to searching the whole mailbox
 
-                email_data = {
-                    'subject': None,
-                    'sender': None,
-                    'content': None
-                }
+                message_ids = self.list_message_ids(None, max_results, query=query)
+                messages = self.get_messages(message_ids, headers_only)
+                return [self.parse_message(messages[message_id]) for message_id in message_ids if message_id in messages]
+            except HttpError as error:
+                print(f'An error occurred: {error}')
+                return []
 
-                headers = msg.get('payload', {}).get('headers', [])
-                for header in headers:
-                    if header['name'].lower() == 'subject':
-                        email_data['subject'] = header['value']
-                    elif header['name'].lower() == 'from':
-                        email_data['sender'] = header['value']
+    def list_message_ids(self, label_ids, max_results, query=None):
+        """Returns the ids of the newest messages with the given labels, and matching the Gmail search query if one is
+        given, following pages if more than one is needed."""
+        message_ids = []
+        page_token = None
+        while len(message_ids) < max_results:
+            results = self.service.users().messages().list(
+                userId='me', labelIds=label_ids, q=query, maxResults=min(max_results - len(message_ids), MAX_LIST_RESULTS),
+                pageToken=page_token
+            ).execute()
+            message_ids += [message['id'] for message in results.get('messages', [])]
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return message_ids
 
-                parts = msg.get('payload', {}).get('parts', [])
-                for part in parts:
-                    if part['mimeType'] == 'text/plain':
-                        data = part['body'].get('data')
-                        if data:
-                            email_data['content'] = base64.urlsafe_b64decode(data.encode('ASCII')).decode('utf-8')
-                            break
+    def get_messages(self, message_ids, headers_only=False):
+        """Fetches messages in batch requests of up to `batch_size` gets, retrying gets that were rate limited once.
+        Returns a dict of message id to message. The lock must be held by the caller."""
+        messages = {}
+        retry_ids = []
 
-                emails.append(email_data)
+        def handle_response(request_id, response, exception):
+            if exception is None:
+                messages[request_id] = response
+            elif isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES:
+                retry_ids.append(request_id)
+            else:
+                print(f'An error occurred fetching message {request_id}: {exception}')
 
-            return emails
+        pending = list(message_ids)
+        for attempt in range(2):  # Gets that were rate limited are retried once, after a pause
+            if attempt:
+                time.sleep(1)
+            retry_ids.clear()
+            for start in range(0, len(pending), self.batch_size):
+                batch = self.service.new_batch_http_request(callback=handle_response)
+                for message_id in pending[start:start + self.batch_size]:
+                    batch.add(self.get_message_request(message_id, headers_only), request_id=message_id)
+                batch.execute()
+            pending = list(retry_ids)
+            if not pending:
+                break
+        if pending:
+            print(f'Gave up fetching {len(pending)} rate limited messages')
+        return messages
 
-        except HttpError as error:
-            print(f'An error occurred: {error}')
-            return []
+    def get_message_request(self, message_id, headers_only):
+        """Returns the request for one message, asking only for the headers that are used when the body isn't needed."""
+        if headers_only:
+            return self.service.users().messages().get(userId='me', id=message_id, format='metadata',
+                                                       metadataHeaders=['Subject', 'From'])
+        return self.service.users().messages().get(userId='me', id=message_id, format='full')
+
+    @staticmethod
+    def parse_message(msg):
+        """Extracts the subject, sender and plain text content of a message."""
+        email_data = {
+            'subject': None,
+            'sender': None,
+            'content': None
+        }
+
+        headers = msg.get('payload', {}).get('headers', [])
+        for header in headers:
+            if header['name'].lower() == 'subject':
+                email_data['subject'] = header['value']
+            elif header['name'].lower() == 'from':
+                email_data['sender'] = header['value']
+
+        parts = msg.get('payload', {}).get('parts', [])
+        for part in parts:
+            if part['mimeType'] == 'text/plain':
+                data = part['body'].get('data')
+                if data:
+                    email_data['content'] = base64.urlsafe_b64decode(data.encode('ASCII')).decode('utf-8')
+                    break
+
+        return email_data
+
+
+if __name__ == '__main__':
+    # Signs in to Gmail in the browser and saves the token, which the assistant's email tools then use
+    if GmailClient().get_gmail_service(authorize=True):
+        print("Signed in to Gmail.")
+    else:
+        print("Could not sign in to Gmail, check that config/secure/credentials.json exists.")
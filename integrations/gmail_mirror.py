@@ -0,0 +1,180 @@
+import re
+import sqlite3
+from pathlib import Path
+
+from googleapiclient.errors import HttpError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER,
+    labels TEXT,
+    subject TEXT,
+    sender TEXT,
+    content TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages (internal_date);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    subject, sender, content, content='messages', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS messages_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, subject, sender, content) VALUES (new.rowid, new.subject, new.sender, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, content)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_update AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, subject, sender, content)
+    VALUES ('delete', old.rowid, old.subject, old.sender, old.content);
+    INSERT INTO messages_fts (rowid, subject, sender, content) VALUES (new.rowid, new.subject, new.sender, new.content);
+END;
+"""
+SEARCH_TERM = re.compile(r'\w+')
+
+
+class GmailMirror:
+    """
+    A local SQLite copy of the newest messages in the user's mailbox, with full-text search over their subject, sender
+    and plain text content.
+
+    The first sync fetches up to `size` messages. Later syncs only fetch what changed since the last one, using the
+    mailbox's history, so reading from the mirror costs one history request when nothing is new, and then drop the
+    oldest messages beyond `size`. Every method must be called with the GmailClient's lock held.
+    """
+
+    def __init__(self, client, path="cache/gmail.sqlite3", size=200):
+        self.client = client
+        self.size = size
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)  # Only used under the client's lock
+        self.connection.executescript(SCHEMA)
+
+    def get_state(self, key):
+        row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def sync(self):
+        """Brings the mirror up to date, with a full sync the first time or if the history has expired."""
+        history_id = self.get_state("history_id")
+        if history_id is None:
+            self.full_sync()
+            return
+        try:
+            self.incremental_sync(history_id)
+        except HttpError as error:
+            if error.resp.status != 404:  # Gmail only keeps about a week of history
+                raise
+            self.full_sync()
+
+    def full_sync(self):
+        """Replaces the mirror with the newest `size` messages."""
+        # Read the history id first, so changes made while syncing are picked up by the next sync
+        history_id = self.client.service.users().getProfile(userId='me').execute()['historyId']
+        message_ids = self.client.list_message_ids(None, self.size)
+        messages = self.client.get_messages(message_ids)
+        with self.connection:
+            self.connection.execute("DELETE FROM messages")
+            self.store_messages(messages.values())
+            self.set_state("history_id", history_id)
+            self.set_state("complete", len(message_ids) < self.size)  # Whether the whole mailbox fitted
+
+    def incremental_sync(self, start_history_id):
+        """Applies the messages added, deleted and relabelled since the given history id."""
+        added, deleted, relabelled = set(), set(), {}
+        history_id = start_history_id
+        page_token = None
+        while True:
+            results = self.client.service.users().history().list(
+                userId='me', startHistoryId=start_history_id, pageToken=page_token,
+                historyTypes=['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+            ).execute()
+            for record in results.get('history', []):
+                for change in record.get('messagesAdded', []):
+                    added.add(change['message']['id'])
+                    deleted.discard(change['message']['id'])
+                for change in record.get('messagesDeleted', []):
+                    deleted.add(change['message']['id'])
+                    added.discard(change['message']['id'])
+                for change in record.get('labelsAdded', []) + record.get('labelsRemoved', []):
+                    relabelled[change['message']['id']] = change['message'].get('labelIds', [])
+            history_id = results.get('historyId', history_id)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        messages = self.client.get_messages(list(added)) if added else {}
+        with self.connection:
+            self.store_messages(messages.values())
+            self.connection.executemany("DELETE FROM messages WHERE id = ?", [(message_id,) for message_id in deleted])
+            self.connection.executemany(
+                "UPDATE messages SET labels = ? WHERE id = ?",
+                [(self.format_labels(labels), message_id) for message_id, labels in relabelled.items()
+                 if message_id not in added and message_id not in deleted]
+            )
+            self.trim()
+            self.set_state("history_id", history_id)
+
+    def trim(self):
+        """Deletes the oldest messages beyond `size`, after which the mirror no longer holds the whole mailbox."""
+        trimmed = self.connection.execute(
+            "DELETE FROM messages WHERE id NOT IN (SELECT id FROM messages ORDER BY internal_date DESC LIMIT ?)",
+            (self.size,)
+        ).rowcount
+        if trimmed:
+            self.set_state("complete", False)
+
+    def store_messages(self, messages):
+        """Inserts or replaces messages, fetched in full format."""
+        rows = []
+        for msg in messages:
+            email_data = self.client.parse_message(msg)
+            rows.append((msg['id'], msg.get('threadId'), int(msg.get('internalDate', 0)),
+                         self.format_labels(msg.get('labelIds', [])),
+                         email_data['subject'], email_data['sender'], email_data['content']))
+        self.connection.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    @staticmethod
+    def format_labels(label_ids):
+        """Stores labels space separated, with spaces at the ends, so a label can be matched with LIKE '% LABEL %'."""
+        return " " + " ".join(label_ids) + " "
+
+    @property
+    def complete(self):
+        """Whether the mirror holds every message in the mailbox, rather than only the newest `size`."""
+        return self.get_state("complete") == "True"
+
+    def read_emails(self, label_ids, max_results, headers_only=False):
+        """Returns the newest mirrored emails that have all of the given labels."""
+        label_ids = label_ids or []
+        conditions = " AND ".join(["labels LIKE ?"] * len(label_ids)) or "1"
+        rows = self.connection.execute(
+            f"SELECT subject, sender, content FROM messages WHERE {conditions} ORDER BY internal_date DESC LIMIT ?",
+            [f"% {label_id} %" for label_id in label_ids] + [max_results]
+        ).fetchall()
+        return [self.to_email(row, headers_only) for row in rows]
+
+    def search(self, query, max_results, headers_only=False):
+        """Returns the mirrored emails that best match every word of the query, as a prefix, newest first among equals."""
+        terms = SEARCH_TERM.findall(query)
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        rows = self.connection.execute(
+            "SELECT messages.subject, messages.sender, messages.content FROM messages_fts "
+            "JOIN messages ON messages.rowid = messages_fts.rowid WHERE messages_fts MATCH ? "
+            "ORDER BY bm25(messages_fts), messages.internal_date DESC LIMIT ?",
+            (match, max_results)
+        ).fetchall()
+        return [self.to_email(row, headers_only) for row in rows]
+
+    @staticmethod
+    def to_email(row, headers_only):
+        """Converts a row into the same dict GmailClient.parse_message returns."""
+        subject, sender, content = row
+        return {'subject': subject, 'sender': sender, 'content': None if headers_only else content}
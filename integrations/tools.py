@@ -0,0 +1,54 @@
+"""
+Tools backed by the integrations. Each integration is only imported and constructed the first time one of its tools is
+called, so the Google client libraries and the HTTP cache are skipped unless they are needed. The Gmail tools never
+start the OAuth flow themselves, and return an error asking the user to sign in if there is no valid token.
+"""
+from typing import Annotated
+
+from utils.tool_registry import tool, LazyIntegration
+
+gmail_client = LazyIntegration("integrations.gmail", "GmailClient")
+webpage_fetcher = LazyIntegration("integrations.webpage_handler", "WebpageHandler")
+file_handler = LazyIntegration("integrations.file_handler", "FileHandler")
+
+
+@tool("Returns recent emails from the user's inbox.", budget=1500)
+def get_emails(quantity: Annotated[int, "The number of emails to return"],
+               headers_only: Annotated[bool, "Only return the subject and sender of each email, which is faster"] = False):
+    return gmail_client.get().read_emails(max_results=quantity, headers_only=headers_only)
+
+
+@tool("Searches the user's emails by words in their subject, sender or content, and returns the best matches.", budget=1500)
+def search_emails(query: Annotated[str, "Words to search for, such as a sender's name or a topic"],
+                  quantity: Annotated[int, "The number of emails to return"] = 5):
+    return gmail_client.get().search_emails(query, max_results=quantity)
+
+
+@tool("Sends an email on the users behalf.")
+def send_email(to: Annotated[str, "The email address of the recipient"],
+               subject: Annotated[str, "The subject line of the email"],
+               body: Annotated[str, "The content of the email"]):
+    gmail_client.get().send_email(to, subject, body)
+    return "Email sent successfully."
+
+
+@tool("Returns the content of a webpage. If the user requests a google search, use duckduckgo instead. "
+      "This should be called if you want to get information from a webpage.", budget=2000)
+def get_webpage_content(url: Annotated[str, "The URL of the webpage"]):
+    return webpage_fetcher.get().get_content(url)
+
+
+@tool("Opens a webpage in the users default browser. This should be called if the user wants to see a webpage.")
+def open_webpage(url: Annotated[str, "The URL of the webpage"]):
+    webpage_fetcher.get().open_link(url)
+    return "Webpage opened successfully."
+
+
+@tool("Opens a file in the default application.")
+def open_file(file_path: Annotated[str, "The path of the file"]):
+    return file_handler.get().open_file_with_default_program(file_path)
+
+
+@tool("Returns a list of files and dirs in a directory")
+def get_files_in_directory(dir_path: Annotated[str, "The path of the directory"]):
+    return file_handler.get().get_files_in_directory(dir_path)
@@ -1,8 +1,10 @@
 import webbrowser
 
 import requests
-from bs4 import BeautifulSoup
-import requests
+
+from utils.content_extractor import ContentExtractor
+from utils.http_client import HttpClient
+from utils.settings_manager import SettingsManager
 
 
 class WebpageHandler:
@@ -11,17 +13,20 @@ class WebpageHandler:
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
         }
+        self.client = HttpClient(headers=self.headers)  # Shared by every fetch, so connections and the cache are reused
+        self.max_bytes = SettingsManager().get_setting("webpage_max_bytes", 2 * 1024 * 1024)
 
     def get_content(self, url):
-        """Fetches and returns the text content and links (with hyperlink names) of a webpage given its URL."""
+        """Fetches and returns the title, main text content and links (with hyperlink names) of a webpage given its
+        URL. The page is parsed as it downloads, and cut off at webpage_max_bytes. Text is separated by newlines, so
+        boilerplate lines can be dropped when the result is shaped."""
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            text_content = soup.get_text(separator=' ', strip=True)
-            links = [{'name': a.get_text(strip=True), 'url': a.get('href')} for a in soup.find_all('a', href=True)]
-            return str({'text': text_content, 'links': links})
+            extractor = ContentExtractor(url)
+            response = self.client.get(url, max_bytes=self.max_bytes, reader=extractor)
+            content = extractor.result()
+            if response.truncated:
+                content['truncated'] = True
+            return content
         except requests.RequestException as e:
             return str(e)
 
@@ -0,0 +1,107 @@
+import json
+import threading
+
+
+def estimate_tokens(message):
+    """Estimates the number of tokens a message will use, at roughly four characters per token."""
+    characters = len(message.get("content") or "")
+    if message.get("tool_calls"):
+        characters += len(json.dumps(message["tool_calls"]))
+    return characters // 4 + 4  # Each message also carries a few tokens of formatting overhead
+
+
+class MessageHistory:
+    """
+    Stores the conversation with the assistant and keeps the messages sent to the model within a token budget.
+
+    The system prompt and the most recent turns are always sent verbatim. When the history grows past the budget,
+    older turns are summarised on a background thread and replaced by a single summary message.
+    """
+
+    def __init__(self, system_message, client, token_budget=6000, recent_turns=4, summary_model="gpt-3.5-turbo"):
+        self.client = client
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_model = summary_model
+        self.lock = threading.Lock()
+        self.system_message = {"role": "system", "content": system_message}
+        self.summary_message = None
+        self.messages = []  # Messages after the system prompt and summary
+        self.message_tokens = []  # Token estimate of each message in self.messages, counted once when appended
+        self.token_count = estimate_tokens(self.system_message)
+        self.compacting = False
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, message):
+        """Adds a message to the history, and starts compacting older turns if the history is over budget."""
+        tokens = estimate_tokens(message)
+        with self.lock:
+            self.messages.append(message)
+            self.message_tokens.append(tokens)
+            self.token_count += tokens
+            if self.token_count > self.token_budget and not self.compacting:
+                compactable = self.compactable_count()
+                if compactable:
+                    self.compacting = True
+                    threading.Thread(target=self.compact, args=(compactable,), daemon=True).start()
+
+    def to_list(self):
+        """Returns the messages to send to the model."""
+        with self.lock:
+            prefix = [self.system_message] + ([self.summary_message] if self.summary_message else [])
+            return prefix + list(self.messages)
+
+    def compactable_count(self):
+        """Returns how many of the oldest messages can be summarised while keeping the recent turns verbatim.
+        Turns start at user or system messages, so tool calls are never separated from their results."""
+        turn_starts = [i for i, message in enumerate(self.messages) if message["role"] in ("user", "system")]
+        if len(turn_starts) <= self.recent_turns:
+            return 0
+        return turn_starts[-self.recent_turns] if self.recent_turns else len(self.messages)
+
+    def compact(self, count):
+        """Summarises the oldest messages and replaces them with the summary. Runs on a background thread."""
+        try:
+            with self.lock:
+                previous_summary = self.summary_message["content"] if self.summary_message else ""
+                old_messages = self.messages[:count]
+            response = self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {"role": "system", "content": "Summarise this conversation between a desktop assistant and its user "
+                                                  "in a few sentences. Keep names, facts, decisions and unfinished "
+                                                  "tasks, and leave out small talk."},
+                    {"role": "user", "content": self.format_transcript(previous_summary, old_messages)}
+                ],
+                temperature=0
+            )
+            summary = response.choices[0].message.content
+            with self.lock:
+                # Messages are only ever appended, so the summarised messages are still at the start of the list
+                self.summary_message = {"role": "system", "content": "Summary of the earlier conversation: " + summary}
+                del self.messages[:count]
+                del self.message_tokens[:count]
+                self.token_count = (estimate_tokens(self.system_message) + estimate_tokens(self.summary_message)
+                                    + sum(self.message_tokens))
+        except Exception as e:
+            print(f"Error compacting message history: {e}")
+        finally:
+            with self.lock:
+                self.compacting = False
+
+    @staticmethod
+    def format_transcript(previous_summary, messages, max_tool_output=2000):
+        """Formats messages as a plain text transcript for the summariser, shortening long tool outputs."""
+        lines = [f"Earlier summary: {previous_summary}"] if previous_summary else []
+        for message in messages:
+            if message.get("tool_calls"):
+                for tool_call in message["tool_calls"]:
+                    lines.append(f"assistant called {tool_call['function']['name']}({tool_call['function']['arguments']})")
+            if message.get("content"):
+                content = message["content"]
+                if message["role"] == "tool":
+                    content = content[:max_tool_output]
+                lines.append(f"{message['role']}: {content}")
+        return "\n".join(lines)
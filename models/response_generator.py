@@ -1,145 +1,253 @@
+import asyncio
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QEventLoop
-from openai import OpenAI
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
 from enums import Role
+from models.message_history import MessageHistory
+from models.sentence_segmenter import SentenceSegmenter
+from models.tool_call_assembler import ToolCallAssembler
+from utils import openai_clients
+from utils.response_cache import ResponseCache
 from utils.settings_manager import SettingsManager
 
 
 class ResponseGenerator(QObject):
-    new_data_signal = pyqtSignal(str)
+    """
+    Generates the assistant's responses on an asyncio event loop running in its own thread.
+
+    Tool calls run as awaitable futures in a worker pool while the stream continues, and Qt only receives the
+    finished sentences through signals, so generation, tool I/O and the UI never block each other. Each sentence is
+    sent with the turn number of the generation it came from, so receivers can drop sentences from a cancelled turn
+    that were already queued.
+    """
+    new_data_signal = pyqtSignal(str, int)
     start_generating_signal = pyqtSignal()
     finished_generating_signal = pyqtSignal()
-    function_call = pyqtSignal(str, str)
-    function_call_completed = pyqtSignal()
 
-    def __init__(self, model: str = "gpt-4-turbo", functions=None):
+    def __init__(self, model: str = "gpt-4-turbo", functions=None, function_handler=None, cancel_token=None):
         super().__init__()
 
         self.model = model
         self.settings_manager = SettingsManager()
-        self.called_function = None
-        self.client = OpenAI(api_key=self.settings_manager.get_setting("api_key"))
-        self.sentence_buffer = ""
-        self.full_response = ""  # Initialize a variable to accumulate the full response
+        self.function_handler = function_handler  # Called with a function name and JSON arguments, returns the result string
+        self.tool_pool = ThreadPoolExecutor(max_workers=self.settings_manager.get_setting("tool_workers", 4),
+                                            thread_name_prefix="tool")
+        self.tool_timeout = self.settings_manager.get_setting("tool_timeout", 30)
+        self.client = openai_clients.get_client()  # Used for history compaction
+        self.async_client = openai_clients.get_async_client()
+        self.segmenter = SentenceSegmenter(  # Optionally splits off the first clause early, to start speaking sooner
+            first_clause=self.settings_manager.get_setting("first_clause_flush", True),
+            min_clause_length=self.settings_manager.get_setting("first_clause_min_chars", 20),
+            max_chunks=self.settings_manager.get_setting("first_clause_max_tokens", 15),
+            max_delay=self.settings_manager.get_setting("first_clause_max_delay_ms", 1000) / 1000
+        )
+        self.response_chunks = []  # Accumulates the streamed chunks of the full response
         system_message = self.settings_manager.get_setting("assistant_personality", "You are a desktop assistant.")  # Loads the assistant's personality
         external_apps = str(self.settings_manager.get_setting("external_applications", []))  # Loads any custom external apps to be passed to the assistant
         user_info = self.settings_manager.get_setting("user_info", "You have no details on the user.")  # Loads any user info to be passed to the assistant
-        self.message_history = [{"role": "system", "content": system_message + "\nExternal Apps: " + external_apps + "\nUser Info: " + user_info}, {"role": "user", "content": "Hello"}]  # Construct the initial message history
+        self.message_history = MessageHistory(  # Construct the initial message history
+            system_message + "\nExternal Apps: " + external_apps + "\nUser Info: " + user_info,
+            self.client,
+            token_budget=self.settings_manager.get_setting("history_token_budget", 6000),
+            recent_turns=self.settings_manager.get_setting("history_recent_turns", 4)
+        )
+        self.message_history.append({"role": "user", "content": "Hello"})
+        self.response_cache = None
+        if self.settings_manager.get_setting("response_cache_enabled", False):  # Opt-in, as cached replies never vary
+            self.response_cache = ResponseCache(
+                max_bytes=self.settings_manager.get_setting("response_cache_max_bytes", 5 * 1024 * 1024),
+                ttl=self.settings_manager.get_setting("response_cache_ttl", 24 * 60 * 60)
+            )
         if functions:
             self.tools = functions
 
+        # The event loop runs in its own thread, and generations are queued on it one at a time
+        self.loop = asyncio.new_event_loop()
+        self.generation_lock = asyncio.Lock()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="generation-loop", daemon=True)
+        self.loop_thread.start()
+        self.generations = set()  # Futures of the generations that are running or queued
+        self.cancel_token = cancel_token
+        self.turn = 0  # The turn number of the running generation
+        if cancel_token:
+            cancel_token.add_callback(self.cancel)
 
     @pyqtSlot(str, Role)
     def get_response(self, user_input: str = None, message_role: Role = Role.USER):
-        """Generates a response to the user's input. If no input is provided, the assistant will generate a response based on the message history."""
-        self.start_generating_signal.emit()
-        try:
-            if user_input:
-                self.message_history.append({"role": message_role.name.lower(), "content": user_input})
-            response_object = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.message_history,
-                temperature=0,
-                stream=True,
-                tools=self.tools
-            )
-
-            for chunk in response_object:
-                if hasattr(chunk.choices[0].delta, 'tool_calls'):
-                    if chunk.choices[0].delta.tool_calls:
-                        # For some reason function calls do not work with streaming, so we have to handle them separately
-                        function_response = self.client.chat.completions.create(
-                            model=self.model,
-                            messages=self.message_history,
-                            temperature=0,
-                            stream=False,
-                            tools=self.tools
-                        )
-                        self.called_function = function_response.choices[0].message.tool_calls[0]
-                        self.message_history.append(
-                            {"role": "assistant", "content": None, "tool_calls": function_response.choices[0].message.tool_calls})
-                        self.execute_function_call(function_response.choices[0].message)
-                        self.get_response()
+        """Generates a response to the user's input. If no input is provided, the assistant will generate a response based on the message history.
+        Returns immediately, the response is generated on the event loop thread."""
+        turn = self.cancel_token.turn if self.cancel_token else 0
+        generation = asyncio.run_coroutine_threadsafe(self.generate(user_input, message_role, turn), self.loop)
+        self.generations.add(generation)
+        generation.add_done_callback(self.generations.discard)
+        return generation
+
+    def cancel(self):
+        """Cancels every running or queued generation, closing any open stream. Safe to call from any thread."""
+        for generation in list(self.generations):
+            generation.cancel()
+
+    def prewarm(self):
+        """Opens a connection for the async client on the event loop, ready for the first response."""
+        asyncio.run_coroutine_threadsafe(openai_clients.prewarm_async(), self.loop)
+
+    def shutdown(self):
+        """Stops the event loop and the tool pool."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.tool_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def generate(self, user_input, message_role, turn=0):
+        """Generates a full response, including any rounds of tool calls."""
+        async with self.generation_lock:
+            self.turn = turn
+            self.start_generating_signal.emit()
+            try:
+                if user_input:
+                    self.message_history.append({"role": message_role.name.lower(), "content": user_input})
+
+                # Only system triggered prompts are cached, as with temperature 0 their replies are effectively fixed
+                cache_key = None
+                if self.response_cache and message_role == Role.SYSTEM:
+                    cache_key = self.response_cache.key(self.model, self.tools, self.message_history.to_list())
+                    cached_response = self.response_cache.get(cache_key)
+                    if cached_response is not None:
+                        print(f"Response cache hit: {self.response_cache.stats()}")
+                        self.replay_response(cached_response)
                         return
-                if hasattr(chunk.choices[0].delta, 'content'):
-                    content = chunk.choices[0].delta.content
-                    if content:
-                        self.full_response += content
-                        self.sentence_buffer += content
-                        self.emit_complete_sentences()
-                    elif content is None:
-                        self.handle_end_of_message()
-                        break
-
-            if self.sentence_buffer.strip():
-                self.new_data_signal.emit(self.sentence_buffer.strip())
-                self.sentence_buffer = ""
 
-
-        except Exception as e:
-            print(f"Error in streaming response: {e}")
-            self.new_data_signal.emit("Sorry, I encountered an error.")
-
-        self.finished_generating_signal.emit()
-
-    def handle_end_of_message(self):
-        """Handles the end of a message by emitting the full response and clearing the sentence buffer."""
-        self.message_history.append({"role": "assistant", "content": self.full_response})
-
-        self.full_response = ""
-        if self.sentence_buffer.strip():
-            self.new_data_signal.emit(self.sentence_buffer.strip())
-            self.sentence_buffer = ""
-
-    def emit_complete_sentences(self):
-        """Checks the buffer for complete sentences and emits them."""
-        while True:
-            quote_indices = [m.start() for m in re.finditer('"', self.sentence_buffer)]
-
-            if len(quote_indices) >= 2:
-                second_quote_index = quote_indices[1]
-                quoted_sentence = self.sentence_buffer[:second_quote_index + 1].strip()
-                self.sentence_buffer = self.sentence_buffer[second_quote_index + 1:].strip()
-                if quoted_sentence:
-                    self.new_data_signal.emit(quoted_sentence)
+                # Each round of tool calls is followed by another completion with their results
+                while await self.stream_response(cache_key):
+                    cache_key = None
+
+            except asyncio.CancelledError:
+                self.handle_cancellation()
+                raise
+            except Exception as e:
+                print(f"Error in streaming response: {e}")
+                self.segmenter.reset()
+                self.response_chunks = []
+                self.emit_sentence("Sorry, I encountered an error.")
+            finally:
+                self.finished_generating_signal.emit()
+
+    async def stream_response(self, cache_key=None):
+        """Streams one completion, emitting sentences as they complete and running tool calls as soon as their arguments are complete.
+        Returns True if tool calls were made, meaning a follow-up completion is needed."""
+        response_object = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self.message_history.to_list(),
+            temperature=0,
+            stream=True,
+            tools=self.tools
+        )
+
+        tool_calls = ToolCallAssembler()
+        function_tasks = {}  # Running tool calls, keyed by tool call id
+        try:
+            async for chunk in response_object:
+                if not chunk.choices:
                     continue
-
-            pattern = re.compile(r'(?<=[.!?])\s+')
-            match = pattern.search(self.sentence_buffer)
-            if match:
-                sentence_end = match.start() + 1
-                complete_sentence = self.sentence_buffer[:sentence_end].strip()
-                quote_indices = [m.start() for m in re.finditer('"', complete_sentence)]
-                if complete_sentence and len(quote_indices) == 0:
-                    self.sentence_buffer = self.sentence_buffer[sentence_end:].strip()
-                    self.new_data_signal.emit(complete_sentence)
-                else:
+                choice = chunk.choices[0]
+                if choice.delta.tool_calls:
+                    for tool_call in tool_calls.add_deltas(choice.delta.tool_calls):
+                        function_tasks[tool_call["id"]] = asyncio.ensure_future(self.run_function_call(tool_call))
+                content = choice.delta.content
+                if content:
+                    self.response_chunks.append(content)
+                    self.emit_complete_sentences(content)
+                if choice.finish_reason:
                     break
-            else:
-                break
-
-    def execute_function_call(self, message):
-        """Executes a function call from the assistant."""
-        self.function_response = None
-        print(message.tool_calls[0].function)
-        self.function_call.emit(message.tool_calls[0].function.name, message.tool_calls[0].function.arguments)
-
-        loop = QEventLoop()
-        self.function_call_completed.connect(loop.quit) # Loops until the function call is completed
-
-        loop.exec_()
+            # Run any tool calls that were still waiting, including when the stream ended without a finish reason
+            for tool_call in tool_calls.finish():
+                function_tasks[tool_call["id"]] = asyncio.ensure_future(self.run_function_call(tool_call))
+
+            if tool_calls:
+                await self.complete_function_calls(tool_calls.ordered_tool_calls(), function_tasks)
+                return True
+        except asyncio.CancelledError:
+            for task in function_tasks.values():
+                task.cancel()
+            await response_object.close()  # Abort the HTTP stream rather than reading it to the end
+            raise
+
+        response = self.handle_end_of_message()
+        if cache_key and response:
+            self.response_cache.set(cache_key, response)
+        return False
 
-        self.message_history.append({
-            "role": "tool",
-            "content": self.function_response,
-            "tool_call_id": message.tool_calls[0].id
-        })
-
-    @pyqtSlot(str)
-    def function_return(self, response):
-        """Receives the response from a function call."""
+    def handle_end_of_message(self):
+        """Handles the end of a message by emitting the full response and clearing the sentence buffer. Returns the full response."""
+        response = "".join(self.response_chunks)
+        self.message_history.append({"role": "assistant", "content": response})
+
+        self.response_chunks = []
+        self.emit_remaining_text()
+        return response
+
+    def handle_cancellation(self):
+        """Records a cancelled response in the message history, so the model knows it was interrupted.
+        Tool calls that had not returned are left out, as the history cannot hold a tool call without its result."""
+        response = "".join(self.response_chunks).strip()
+        self.response_chunks = []
+        self.segmenter.reset()
+        self.message_history.append({"role": "assistant", "content": (response + " " if response else "") + "[Interrupted by the user]"})
+
+    def replay_response(self, response):
+        """Replays a cached response word by word through the same sentence path as a streamed one."""
+        for content in re.findall(r'\s*\S+', response):
+            self.response_chunks.append(content)
+            self.emit_complete_sentences(content)
+        self.handle_end_of_message()
+
+    def emit_complete_sentences(self, content):
+        """Adds streamed content to the segmenter and emits any sentences it completes."""
+        for sentence in self.segmenter.feed(content):
+            self.emit_sentence(sentence)
+
+    def emit_remaining_text(self):
+        """Emits any text left in the segmenter at the end of a message."""
+        remainder = self.segmenter.flush()
+        if remainder:
+            self.emit_sentence(remainder)
+
+    def emit_sentence(self, sentence):
+        """Emits a sentence with its turn number, unless the turn has been cancelled. The generation's task is only
+        cancelled at its next await, so sentences from a chunk that was already being processed are dropped here."""
+        if self.cancel_token and self.cancel_token.is_cancelled(self.turn):
+            return
+        self.new_data_signal.emit(sentence, self.turn)
+
+    async def run_function_call(self, tool_call):
+        """Runs a tool call in the tool pool and returns its result, or an explanation if it failed or timed out."""
+        function = tool_call["function"]
+        print(function)
+        try:
+            response = await asyncio.wait_for(
+                self.loop.run_in_executor(self.tool_pool, self.function_handler, function["name"], function["arguments"]),
+                self.tool_timeout
+            )
+        except asyncio.TimeoutError:
+            response = f"The {function['name']} function timed out after {self.tool_timeout} seconds."
+        except Exception as e:
+            response = str(e)
         print(f"Function response: {response}")
-        self.function_response = response
-        self.function_call_completed.emit()
\ No newline at end of file
+        return response
+
+    async def complete_function_calls(self, tool_calls, function_tasks):
+        """Waits for every tool call to return, then adds the calls and their results to the message history.
+        The tool calls run concurrently, so the results are appended in the order the model made the calls, not the order they finished."""
+        responses = await asyncio.gather(*(function_tasks[tool_call["id"]] for tool_call in tool_calls))
+
+        self.message_history.append({"role": "assistant", "content": "".join(self.response_chunks) or None, "tool_calls": tool_calls})
+        self.response_chunks = []
+        self.emit_remaining_text()
+
+        for tool_call, response in zip(tool_calls, responses):
+            self.message_history.append({
+                "role": "tool",
+                "content": response,
+                "tool_call_id": tool_call["id"]
+            })
@@ -0,0 +1,45 @@
+import re
+
+CLAUSE_BOUNDARY = re.compile(r'[,;:)—](?=\s)|\s[-–—]\s')  # Punctuation that ends a clause
+WORD_BOUNDARY = re.compile(r'\s+')
+
+
+class SentenceChunker:
+    """
+    Reshapes sentences into chunks sized for speech synthesis.
+
+    Sentences longer than `max_length` are split at clause boundaries, or between words if a clause is still too long,
+    so a long quoted block doesn't hold up the first audio. Short sentences that are queued together are merged up to
+    `target_length`, so they share a request. Sentences are only queued while the synthesizer is busy, so merging never
+    delays a clip that could otherwise start straight away.
+    """
+
+    def __init__(self, target_length=150, max_length=250):
+        self.target_length = target_length
+        self.max_length = max_length
+
+    def split(self, sentence):
+        """Splits a sentence into pieces no longer than `max_length`, preferring clause boundaries."""
+        sentence = sentence.strip()
+        pieces = []
+        while len(sentence) > self.max_length:
+            end = self.find_split(sentence, CLAUSE_BOUNDARY) or self.find_split(sentence, WORD_BOUNDARY) or self.max_length
+            pieces.append(sentence[:end].strip())
+            sentence = sentence[end:].strip()
+        if sentence:
+            pieces.append(sentence)
+        return pieces
+
+    def find_split(self, sentence, boundary):
+        """Returns the position after the last boundary that keeps the first piece within `max_length`, or None."""
+        end = None
+        for match in boundary.finditer(sentence, 1, self.max_length + 1):
+            end = match.end()
+        return end
+
+    def take(self, queue):
+        """Removes the next chunk from the front of a queue of sentences and returns it, merging short sentences."""
+        chunk = queue.pop(0)
+        while queue and len(chunk) + 1 + len(queue[0]) <= self.target_length:
+            chunk += " " + queue.pop(0)
+        return chunk
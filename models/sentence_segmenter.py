@@ -0,0 +1,159 @@
+import re
+import time
+from collections import deque
+
+SENTENCE_BOUNDARY = re.compile(r'[.!?](?=\s)')  # Terminal punctuation followed by whitespace
+CLAUSE_BOUNDARY = re.compile(r'[,;:](?=\s)')  # Clause punctuation followed by whitespace
+LAST_SPACE = re.compile(r'.*\s', re.DOTALL)
+QUOTE = re.compile('"')
+LAST_WORD = re.compile(r'\S+$')
+WHITESPACE = re.compile(r'\s*')
+DEFAULT_ABBREVIATIONS = frozenset({"mr", "mrs", "ms", "dr", "prof", "st", "sr", "jr", "vs", "e.g", "i.e"})
+
+
+class SentenceSegmenter:
+    """
+    Splits streamed text into sentences as it arrives.
+
+    Sentences end at '.', '!' or '?' followed by whitespace, and anything between a pair of double quotes is kept
+    together. Each chunk is only scanned once, so the cost is linear in the length of the stream however long the
+    unfinished sentence gets.
+
+    With `first_clause` enabled, the first piece of each stream is also split off at a comma, semicolon or colon, or
+    at the last space once `max_chunks` chunks or `max_delay` seconds have passed without a sentence ending, so speech
+    can start before a long opening sentence is finished. After that, only whole sentences are returned.
+    """
+
+    def __init__(self, abbreviations=DEFAULT_ABBREVIATIONS, context_length=16, first_clause=False,
+                 min_clause_length=20, max_chunks=None, max_delay=None):
+        self.abbreviations = abbreviations  # Lowercase words, without their final '.', that do not end a sentence
+        self.context_length = context_length  # Characters kept from the previous chunk to find boundaries across chunks
+        self.first_clause = first_clause
+        self.min_clause_length = min_clause_length  # Shorter opening clauses are not worth a clip of their own
+        self.max_chunks = max_chunks  # Chunks to wait for the first boundary before splitting at a space, or None
+        self.max_delay = max_delay  # Seconds to wait for the first boundary before splitting at a space, or None
+        self.reset()
+
+    def reset(self):
+        """Clears the segmenter, ready for a new stream."""
+        self.text = ""  # The joined part of the unfinished text, starting at self.text_start in the stream
+        self.text_start = 0
+        self.new_chunks = []  # Chunks received since the text was last joined
+        self.length = 0  # Number of characters received in the stream
+        self.start = 0  # Stream position where the next sentence starts
+        self.context = ""  # The last characters of the stream
+        self.quotes = deque()  # Stream positions of double quotes after self.start
+        self.boundaries = deque()  # Stream positions of sentence ending punctuation after self.start
+        self.clauses = deque()  # Stream positions of clause punctuation after self.start, until the first piece is returned
+        self.first_pending = self.first_clause  # Whether the first piece of the stream may still be split off early
+        self.chunk_count = 0
+        self.first_chunk_time = None
+
+    def feed(self, chunk):
+        """Adds a chunk of streamed text and returns any sentences it completes."""
+        offset = self.length - len(self.context)
+        scanned = self.context + chunk
+        self.quotes.extend(self.length + m.start() for m in QUOTE.finditer(chunk))
+        for m in SENTENCE_BOUNDARY.finditer(scanned, max(len(self.context) - 1, 0)):
+            # The context was already scanned, apart from a final punctuation mark that had no whitespace after it yet
+            if offset + m.start() >= self.start and not self.is_abbreviation(scanned, m.start()):
+                self.boundaries.append(offset + m.start())
+        if self.first_pending:
+            self.scan_clauses(scanned, offset)
+        self.new_chunks.append(chunk)
+        self.length += len(chunk)
+        self.context = scanned[-self.context_length:]
+
+        sentences = []
+        if not self.can_emit():
+            if self.first_pending:
+                self.take_first_clause(sentences)
+            return sentences
+        self.first_pending = False
+        self.clauses.clear()
+        self.join_text()
+        while True:
+            if len(self.quotes) >= 2:
+                # Quoted text is kept together, along with anything before it
+                self.quotes.popleft()
+                sentences.append(self.take_sentence(self.quotes.popleft() + 1))
+            elif self.can_emit():
+                sentences.append(self.take_sentence(self.boundaries.popleft() + 1))
+            else:
+                break
+        self.text = self.text[self.start - self.text_start:]
+        self.text_start = self.start
+        return sentences
+
+    def scan_clauses(self, scanned, offset):
+        """Records the clause boundaries in newly received text, and counts the chunk towards the first piece's deadline."""
+        for m in CLAUSE_BOUNDARY.finditer(scanned, max(len(self.context) - 1, 0)):
+            if offset + m.start() >= self.start and (not self.clauses or offset + m.start() > self.clauses[-1]):
+                self.clauses.append(offset + m.start())
+        if self.first_chunk_time is None:
+            self.first_chunk_time = time.monotonic()
+        self.chunk_count += 1
+
+    def take_first_clause(self, sentences):
+        """Splits off the first piece of the stream at a clause boundary, or at a space once the deadline has passed."""
+        if self.quotes:
+            return  # Quoted text is never split
+        while self.clauses and self.clauses[0] + 1 - self.start < self.min_clause_length:
+            self.clauses.popleft()
+        self.join_text()
+        if self.clauses:
+            end = self.clauses.popleft() + 1
+        elif self.deadline_passed():
+            space = LAST_SPACE.match(self.text, self.start - self.text_start)
+            if space is None or space.end() - (self.start - self.text_start) < self.min_clause_length:
+                return
+            end = self.text_start + space.end()
+        else:
+            return
+        sentences.append(self.take_sentence(end))
+        self.text = self.text[self.start - self.text_start:]
+        self.text_start = self.start
+        self.first_pending = False
+        self.clauses.clear()
+
+    def deadline_passed(self):
+        """Checks whether the first piece has waited for a boundary for longer than `max_chunks` or `max_delay`."""
+        if self.max_chunks is not None and self.chunk_count >= self.max_chunks:
+            return True
+        return self.max_delay is not None and time.monotonic() - self.first_chunk_time >= self.max_delay
+
+    def can_emit(self):
+        """Checks whether the unfinished text contains a complete sentence or quote."""
+        if len(self.quotes) >= 2:
+            return True
+        # A sentence containing an unclosed quote waits for the closing quote
+        return bool(self.boundaries) and not (self.quotes and self.quotes[0] < self.boundaries[0])
+
+    def flush(self):
+        """Returns whatever text is left at the end of the stream, or None if there is none, and resets the segmenter."""
+        self.join_text()
+        remainder = self.text[self.start - self.text_start:].strip()
+        self.reset()
+        return remainder or None
+
+    def join_text(self):
+        """Joins the chunks received since the last join onto the unfinished text."""
+        if self.new_chunks:
+            self.text += "".join(self.new_chunks)
+            self.new_chunks = []
+
+    def take_sentence(self, end):
+        """Removes the text up to the given stream position and returns it as a sentence."""
+        text = self.text[self.start - self.text_start:end - self.text_start]
+        # Skip the whitespace between sentences
+        self.start = self.text_start + WHITESPACE.match(self.text, end - self.text_start).end()
+        while self.boundaries and self.boundaries[0] < self.start:
+            self.boundaries.popleft()
+        return text.strip()
+
+    def is_abbreviation(self, scanned, index):
+        """Checks whether the full stop at the given index ends a known abbreviation, such as 'Dr.'."""
+        if scanned[index] != "." or not self.abbreviations:
+            return False
+        word = LAST_WORD.search(scanned, max(index - 12, 0), index)  # Abbreviations are short, so only look back a little
+        return word is not None and word.group().lstrip("(\"'").lower() in self.abbreviations
@@ -1,91 +1,232 @@
-import os
-import tempfile
-import time
-
-from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QTimer
 import threading
-from playsound import playsound
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
+from models.sentence_chunker import SentenceChunker
+from utils import openai_clients
+from utils.audio_output import AudioOutput
 from utils.settings_manager import SettingsManager
-from openai import OpenAI
+from utils.speech_cache import SpeechCache
+
+TTS_MODEL = "tts-1-hd"
+TTS_VOICE = "nova"
+TTS_FORMAT = "pcm"
+SAMPLE_RATE = 24000  # The speech endpoint returns PCM as 24 kHz, 16-bit, mono
+CHUNK_SIZE = 4096
+
+
+class AudioClip:
+    """The PCM audio of one sentence, filled in by a synthesis worker while it is being played."""
+
+    def __init__(self, sentence):
+        self.sentence = sentence
+        self.chunks = deque()
+        self.condition = threading.Condition()
+        self.complete = False
+        self.cancelled = False
+        self.error = None
+        self.future = None
+
+    def append(self, data):
+        """Adds audio as it arrives from the speech endpoint."""
+        with self.condition:
+            self.chunks.append(data)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        """Marks the clip as complete, or failed if an error is given."""
+        with self.condition:
+            self.complete = True
+            self.error = error
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Stops the clip's synthesis and playback."""
+        with self.condition:
+            self.cancelled = True
+            self.chunks.clear()
+            self.condition.notify_all()
+        if self.future is not None:
+            self.future.cancel()
+
+    def read(self):
+        """Waits for the next piece of audio and returns it, or None once the clip is complete or cancelled."""
+        with self.condition:
+            while not self.chunks and not self.complete and not self.cancelled:
+                self.condition.wait()
+            if self.cancelled or not self.chunks:
+                return None
+            return self.chunks.popleft()
 
 
 class SpeechGenerator(QObject):
-    finished = pyqtSignal()
+    """
+    Synthesizes and plays the assistant's sentences.
+
+    Up to `tts_lookahead` sentences are synthesized at once in a worker pool, while the clips are played strictly in
+    the order the sentences arrived. New sentences are only sent for synthesis as clips are played, so a long reply
+    never runs far ahead of playback.
+
+    Audio is requested as raw PCM and written to one long-lived output stream as it arrives, so playback starts with
+    the first bytes of a clip, consecutive clips play without gaps and nothing is written to disk.
+
+    A scheduler thread waits on a condition variable, and is only woken when a sentence is added, a clip starts
+    synthesizing or the turn is cancelled, so it never wakes up while idle.
+    """
+    finished = pyqtSignal(str)
     start_speaking = pyqtSignal()
     finished_speaking = pyqtSignal()
 
-    def __init__(self):
+    def __init__(self, cancel_token=None, audio_backend=None):
         super().__init__()
-        self.is_playing_audio = None
-        self.sentence_queue = []
-        self.current_audio = None
-        self.current_sentence = None
-        self.audio_queue = []
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.play_next_audio)
-        self.timer.start(1000)
+        self.is_playing_audio = False
+        self.sentence_queue = []  # Sentences, split to at most the chunker's max length, waiting to be synthesized
+        self.audio_queue = []  # AudioClips in playback order, synthesizing or ready
+        self.current_clip = None  # The clip being played
+        self.condition = threading.Condition()
+        self.running = True
         self.total_chars = 0
         self.settings_manager = SettingsManager()
-        self.client = OpenAI(api_key=self.settings_manager.get_setting("api_key"))
+        self.lookahead = self.settings_manager.get_setting("tts_lookahead", 3)
+        self.sentence_gap = self.settings_manager.get_setting("speech_gap_ms", 250) / 1000  # Pause between sentences
+        self.chunker = SentenceChunker(
+            target_length=self.settings_manager.get_setting("tts_target_chars", 150),
+            max_length=self.settings_manager.get_setting("tts_max_chars", 250)
+        )
+        self.synthesis_pool = ThreadPoolExecutor(max_workers=self.lookahead, thread_name_prefix="tts")
+        self.output = AudioOutput(samplerate=SAMPLE_RATE, backend=audio_backend)  # Started on each first write, and stopped when idle
+        self.client = openai_clients.get_client()
+        self.speech_cache = None
+        if self.settings_manager.get_setting("speech_cache_enabled", True):
+            self.speech_cache = SpeechCache(
+                max_bytes=self.settings_manager.get_setting("speech_cache_max_bytes", 50 * 1024 * 1024)
+            )
+        self.cancel_token = cancel_token
+        if cancel_token:
+            cancel_token.add_callback(self.cancel)
+        self.scheduler_thread = threading.Thread(target=self.run_scheduler, name="speech-scheduler", daemon=True)
+        self.scheduler_thread.start()
 
-    @pyqtSlot()
     def process_sentences(self):
-        """Processes the sentences in the queue and generates audio for them."""
-        if self.sentence_queue:
-            self.total_chars += len(self.sentence_queue[0])
-            try:
-                next_sentence = self.sentence_queue[0]
-
-
-                response = self.client.audio.speech.create(
-                    model="tts-1-hd",
-                    voice="nova",
-                    input=next_sentence,
-                )
-                temp_dir = tempfile.gettempdir()
-                temp_file = tempfile.mktemp(suffix=".mp3", dir=temp_dir)
-
-                response.stream_to_file(temp_file)
-                self.sentence_queue.pop(0)
-                self.audio_queue.append(temp_file)
-            except Exception as e:
-                SettingsManager().update_setting("assistant_chat_bubbles", True)
-                if not self.is_playing_audio:
-                    threading.Thread(target=self.play_audio, args=(False, self.sentence_queue.pop(0))).start()
-
-    def play_audio(self, audio=True, sentence=None):
-        """Plays the audio from the audio queue."""
-        if audio:
-            while self.audio_queue:
-                self.finished.emit()  # Signal that the audio has finished playing
-                self.start_speaking.emit()
-                next_audio_to_play = self.audio_queue.pop(0)
-                playsound(next_audio_to_play)
-                os.remove(next_audio_to_play)
-                self.finished_speaking.emit()
-                time.sleep(0.5)
-        else:  # If the audio is not in the queue for whatever reason
-            self.is_playing_audio = True
+        """Sends queued sentences for synthesis, while fewer than `lookahead` clips are synthesizing or waiting to play.
+        Sentences that queued up while the synthesizer was busy are merged into one clip. The condition must be held by
+        the caller."""
+        while self.sentence_queue and len(self.audio_queue) < self.lookahead:
+            clip = AudioClip(self.chunker.take(self.sentence_queue))
+            self.total_chars += len(clip.sentence)
+            clip.future = self.synthesis_pool.submit(self.synthesize, clip)
+            self.audio_queue.append(clip)
+
+    def synthesize(self, clip):
+        """Streams the audio of a clip's sentence into the clip as raw PCM, from the speech cache if it has been said before."""
+        cache_key = self.speech_cache.key(TTS_MODEL, TTS_VOICE, clip.sentence, TTS_FORMAT) if self.speech_cache else None
+        if cache_key:
+            audio = self.speech_cache.get(cache_key)
+            if audio is not None:
+                clip.append(audio)
+                clip.finish()
+                return
+
+        try:
+            chunks = []
+            with self.client.audio.speech.with_streaming_response.create(
+                model=TTS_MODEL,
+                voice=TTS_VOICE,
+                input=clip.sentence,
+                response_format=TTS_FORMAT
+            ) as response:
+                for data in response.iter_bytes(CHUNK_SIZE):
+                    if clip.cancelled:
+                        return
+                    clip.append(data)
+                    chunks.append(data)
+            clip.finish()
+        except Exception as e:
+            clip.finish(e)
+            return
+
+        if cache_key:
+            self.speech_cache.set(cache_key, b"".join(chunks))
+
+    def next_clip(self):
+        """Waits until there is a clip to play, then removes and returns it. Returns None when shutting down."""
+        with self.condition:
+            while self.running:
+                self.process_sentences()
+                if self.audio_queue:
+                    self.current_clip = self.audio_queue.pop(0)
+                    self.process_sentences()  # Taking this clip frees a slot for the next sentence
+                    self.is_playing_audio = True
+                    return self.current_clip
+                self.condition.wait()
+            return None
+
+    def run_scheduler(self):
+        """Plays clips in order, writing their audio to the output stream as it arrives. Runs on the scheduler thread."""
+        while True:
+            clip = self.next_clip()
+            if clip is None:
+                return
+            data = clip.read()  # Wait for the first audio, so the sentence is shown as it starts being spoken
+
+            if not clip.cancelled:
+                self.finished.emit(clip.sentence)  # Show the text as it starts being spoken
             self.start_speaking.emit()
-            self.finished.emit()  # Signal that the audio has finished playing
-            time.sleep(len(sentence) / 25)  # Wait depending on the length of the sentence, to simulate the time it would take to say it
+            if data is not None:
+                while data is not None and not clip.cancelled and self.output.write(data):
+                    data = clip.read()
+            elif clip.error is not None:  # If the audio could not be generated, show the sentence for as long as it would take to say it
+                self.settings_manager.update_setting("assistant_chat_bubbles", True)
+                with self.condition:
+                    self.condition.wait(len(clip.sentence) / 25)  # Cut short if the turn is cancelled
+
+            with self.condition:
+                self.current_clip = None
+                more_queued = bool(self.audio_queue or self.sentence_queue)
+            if clip.cancelled:
+                self.output.clear()  # Drop anything written while the turn was being cancelled
+            elif more_queued:
+                self.output.write_silence(self.sentence_gap)  # Queued behind this clip, so the next one follows without a gap
+            else:
+                self.output.drain()  # Nothing else to say, so wait for the last of the audio to be heard
+            if not more_queued:
+                self.output.stop()  # Release the device until the next sentence, unless one arrived meanwhile
             self.finished_speaking.emit()
-        self.is_playing_audio = False
 
-    @pyqtSlot(str)
-    def add_sentence(self, sentence):
-        """Adds a sentence to the queue."""
-        self.sentence_queue.append(sentence)
-        if not self.audio_queue:
-            self.process_sentences()
+            with self.condition:
+                self.is_playing_audio = False
 
-    @pyqtSlot()
-    def play_next_audio(self):
-        """Continually called by a timer, checks if there is audio to play."""
-        # Main loop
-        if self.audio_queue and not self.is_playing_audio:
-            self.is_playing_audio = True  # Set the flag to indicate that audio is being played
-            threading.Thread(target=self.play_audio).start()
-        elif not self.audio_queue:
+    def cancel(self):
+        """Drops every queued sentence and clip, and stops playback immediately. Called by the cancel token, from any thread."""
+        with self.condition:
+            self.sentence_queue.clear()
+            for clip in self.audio_queue:
+                clip.cancel()
+            self.audio_queue.clear()
+            if self.current_clip is not None:
+                self.current_clip.cancel()
+            self.output.clear()
+            self.condition.notify_all()
+
+    def shutdown(self):
+        """Stops the scheduler thread, the synthesis pool and the output stream."""
+        self.cancel()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.synthesis_pool.shutdown(wait=False, cancel_futures=True)
+        self.output.close()
+
+    @pyqtSlot(str)
+    @pyqtSlot(str, int)
+    def add_sentence(self, sentence, turn=None):
+        """Adds a sentence to the queue, split if it is too long, and wakes the scheduler to start synthesizing it.
+        A sentence from a turn that has since been cancelled is dropped, as it was queued before the cancellation."""
+        with self.condition:  # Checked under the lock, as cancel clears the queue under it after the turn changes
+            if turn is not None and self.cancel_token and self.cancel_token.is_cancelled(turn):
+                return
+            self.sentence_queue.extend(self.chunker.split(sentence))
             self.process_sentences()
+            self.condition.notify_all()
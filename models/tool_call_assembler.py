@@ -0,0 +1,62 @@
+import json
+
+
+class ToolCallAssembler:
+    """Rebuilds complete tool calls from the tool call deltas of a streamed chat completion."""
+
+    def __init__(self):
+        self.tool_calls = {}  # Tool calls being assembled, keyed by their stream index
+        self.dispatched = set()  # Indices of the tool calls that have already been returned as complete
+
+    def __bool__(self):
+        return bool(self.tool_calls)
+
+    def add_deltas(self, deltas):
+        """Merges a chunk's tool call deltas, returning any tool calls that are now complete."""
+        completed = []
+        for delta in deltas:
+            tool_call = self.tool_calls.setdefault(delta.index, {
+                "id": None,
+                "type": "function",
+                "function": {"name": "", "arguments": ""}
+            })
+            if delta.id:
+                tool_call["id"] = delta.id
+            if delta.function:
+                if delta.function.name:
+                    tool_call["function"]["name"] += delta.function.name
+                if delta.function.arguments:
+                    tool_call["function"]["arguments"] += delta.function.arguments
+
+            # Tool calls are streamed one after another, so a new index means every earlier call has finished
+            for index in sorted(self.tool_calls):
+                if index < delta.index and index not in self.dispatched:
+                    completed.append(self.mark_dispatched(index))
+            if delta.index not in self.dispatched and self.arguments_complete(tool_call):
+                completed.append(self.mark_dispatched(delta.index))
+        return completed
+
+    def finish(self):
+        """Called when the stream ends, returns every tool call that has not been returned yet."""
+        return [self.mark_dispatched(index) for index in sorted(self.tool_calls) if index not in self.dispatched]
+
+    def ordered_tool_calls(self):
+        """Returns all assembled tool calls in the order the model produced them."""
+        return [self.tool_calls[index] for index in sorted(self.tool_calls)]
+
+    def mark_dispatched(self, index):
+        """Marks a tool call as complete and returns it."""
+        self.dispatched.add(index)
+        return self.tool_calls[index]
+
+    @staticmethod
+    def arguments_complete(tool_call):
+        """Checks whether a tool call has its id, name and a full JSON object of arguments."""
+        function = tool_call["function"]
+        arguments = function["arguments"].strip()
+        if not (tool_call["id"] and function["name"] and arguments.endswith("}")):
+            return False
+        try:
+            return isinstance(json.loads(arguments), dict)
+        except json.JSONDecodeError:
+            return False
@@ -1,21 +1,20 @@
-import os
-import queue
-import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import numpy as np
-import sounddevice as sd
 from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
-from openai import OpenAI
-from scipy.io.wavfile import write
 
+from utils import audio_backends, openai_clients
+from utils.audio_buffer import AudioRingBuffer
+from utils.audio_encoding import encode_speech
 from utils.settings_manager import SettingsManager
+from utils.voice_activity import VoiceActivityDetector
 
 
 class Transcriber(QThread):
     transcription_complete = pyqtSignal(str)  # Signal to emit the transcribed text
 
     def __init__(self, samplerate=44100, channels=1, model="whisper-1", silence_threshold=0.01, silence_duration=1.5,
-                 parent=None):
+                 parent=None, audio_backend=None):
         super(Transcriber, self).__init__(parent)
         self.speech_threshold = 0.01
         self.base_silence_duration = 1
@@ -26,69 +25,120 @@ class Transcriber(QThread):
         self.silence_threshold = silence_threshold
         self.silence_duration = silence_duration
         self.settings_manager = SettingsManager()
-        self.client = OpenAI(api_key=self.settings_manager.get_setting("api_key"))  # Initialize OpenAI client here
-        self.audio_queue = queue.Queue()
+        self.client = openai_clients.get_client()  # Initialize OpenAI client here
+        self.audio_backend = audio_backend or audio_backends.get_backend()
+        self.upload_samplerate = self.settings_manager.get_setting("transcription_samplerate", 16000)
+        self.upload_size = 0  # Bytes uploaded by the last transcription
+        self.encode_time = 0.0  # Seconds spent encoding the last upload
+        self.max_recording_duration = self.settings_manager.get_setting("max_recording_seconds", 60)
+        self.detector = VoiceActivityDetector(
+            samplerate,
+            speech_threshold=self.speech_threshold,
+            silence_threshold=silence_threshold,
+            hangover=self.settings_manager.get_setting("vad_hangover_ms", 300) / 1000,
+            pre_roll=self.settings_manager.get_setting("vad_pre_roll_ms", 300) / 1000
+        )
+        # Holds the longest recording, with its pre-roll and the silence that ends it, so memory use is fixed
+        buffer_duration = self.max_recording_duration + self.max_silence_duration + 1
+        self.audio_buffer = AudioRingBuffer(int(buffer_duration * samplerate) + self.detector.pre_roll)
+        # Long recordings are cut at pauses and transcribed while the user is still speaking
+        self.streaming = self.settings_manager.get_setting("streaming_transcription", True)
+        self.segment_pause = self.settings_manager.get_setting("transcription_segment_pause_ms", 500) / 1000
+        self.min_segment_duration = self.settings_manager.get_setting("transcription_min_segment_seconds", 5)
+        self.prompt_characters = 200  # Characters of the transcript so far used to prompt the next segment
+        self.segment_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcription")  # Keeps segments in order
 
-    def audio_callback(self, indata):
-        """Callback function to process audio data from the microphone."""
-        self.audio_queue.put(indata.copy())
+    def audio_callback(self, indata, frames, time_info, status):
+        """Callback function to process audio data from the microphone. Mixes the block to mono into the ring buffer."""
+        self.audio_buffer.write(indata[:, 0] if indata.shape[1] == 1 else indata.mean(axis=1))
 
-    def record_audio(self):
+    def record_audio(self, segment_callback=None):
         """
         Records audio from the microphone and returns the audio data.
 
         Designed to wait until it detects enough volume to start recording, then waits for a period of silence to stop recording.
+        If a segment callback is given, it is called with each completed segment of a long recording, cut at a pause, and
+        only the audio after the last segment is returned.
         """
-        with sd.InputStream(callback=self.audio_callback, channels=self.channels, samplerate=self.samplerate):
-            recorded_audio = []
-            silence_counter = 0
-            speech_detected = False
-            while True:
-                indata = self.audio_queue.get()
-                if indata.any():
-                    volume = np.sqrt(np.mean(indata ** 2))  # RMS value of the audio data, used to compare volume
-                    if volume > self.speech_threshold:
-                        speech_detected = True
-                        recorded_audio.append(indata)
-                        silence_counter = 0
-                    elif volume < self.silence_threshold and speech_detected:
-                        scaling_factor = 0.2
-                        current_silence_duration = min(  # Scale the required silence duration based on the length of the recording
-                            self.max_silence_duration,
-                            self.base_silence_duration + (len(recorded_audio) / self.samplerate) * scaling_factor
-                        )
-                        silence_limit = current_silence_duration * self.samplerate / 1024
-                        silence_counter += 1
-                        if silence_counter > silence_limit:
-                            break
-                    elif speech_detected:
-                        recorded_audio.append(indata)
-                else:
-                    break
-            audio_data = np.concatenate(recorded_audio, axis=0)
-        return audio_data
-
-    def transcribe_audio(self, audio_data):
-        """Transcribes the given audio data and returns the transcribed text."""
-        temp_dir = tempfile.gettempdir()
-        temp_file = tempfile.mktemp(suffix=".wav", dir=temp_dir)
-        write(temp_file, self.samplerate, audio_data)  # Saves the audio data to a temporary file, to be used for transcription
-
-        try:
-            with open(temp_file, "rb") as tmpfile:
-                transcription = self.client.audio.transcriptions.create(
-                    model=self.model,
-                    file=tmpfile,
-                    language="en"
-                )
-                return transcription.text
-        finally:
-            os.remove(temp_file)  # Remove the temporary file after transcription
+        self.audio_buffer.clear()
+        self.detector.reset()
+        segment_start = None
+        with self.audio_backend.input_stream(self.samplerate, self.channels, self.audio_callback):
+            while not self.recording_finished():
+                written = self.audio_buffer.wait(self.detector.position + self.detector.frame_length - 1)  # A whole frame
+                self.detector.process(self.audio_buffer.read(self.detector.position, written))
+                if segment_callback and self.detector.speech_detected:
+                    if segment_start is None:
+                        segment_start = self.detector.recording_bounds()[0]
+                    segment_end = self.detector.recording_bounds()[1]
+                    if (self.detector.silence_after_hangover >= self.segment_pause
+                            and segment_end - segment_start >= self.min_segment_duration * self.samplerate):
+                        segment_callback(self.audio_buffer.read(segment_start, segment_end))
+                        segment_start = segment_end
+        start, end = self.detector.recording_bounds()
+        return self.audio_buffer.read(segment_start if segment_start is not None else start, end)
+
+    def recording_finished(self):
+        """Checks whether the speech has been followed by enough silence, or the recording has reached its maximum length."""
+        if not self.detector.speech_detected:
+            return False
+        if self.detector.position - self.detector.speech_start >= self.max_recording_duration * self.samplerate:
+            return True
+        scaling_factor = 0.2
+        required_silence = min(  # Scale the required silence duration based on the length of the recording
+            self.max_silence_duration,
+            self.base_silence_duration + self.detector.speech_duration * scaling_factor
+        )
+        return self.detector.trailing_silence >= required_silence
+
+    def transcribe_audio(self, audio_data, prompt=None):
+        """Transcribes the given audio data and returns the transcribed text. The prompt, if given, is the text spoken
+        before the audio."""
+        start = time.perf_counter()
+        # Encodes the audio in memory as trimmed 16 kHz 16-bit mono, a fraction of the size of the recorded float audio
+        upload = encode_speech(audio_data, self.samplerate, self.upload_samplerate, self.silence_threshold)
+        self.encode_time = time.perf_counter() - start
+        self.upload_size = upload.getbuffer().nbytes
+
+        options = {"prompt": prompt} if prompt else {}
+        transcription = self.client.audio.transcriptions.create(
+            model=self.model,
+            file=upload,
+            language="en",
+            **options
+        )
+        return transcription.text
+
+    def transcribe_segment(self, audio_data, transcript):
+        """Transcribes one segment of a recording and adds it to the transcript so far, which it is prompted with so the
+        segments read as one. Runs in the segment pool, one segment at a time."""
+        prompt = " ".join(transcript)[-self.prompt_characters:]
+        transcript.append(self.transcribe_audio(audio_data, prompt=prompt).strip())
+
+    def record_and_transcribe(self):
+        """Records from the microphone, transcribing each segment as soon as it is cut, so only the last segment is left
+        to transcribe when the user stops speaking. Returns the stitched transcript."""
+        transcript = []
+        segments = []
+
+        def transcribe_in_background(audio_data):
+            segments.append(self.segment_pool.submit(self.transcribe_segment, audio_data, transcript))
+
+        remaining_audio = self.record_audio(segment_callback=transcribe_in_background)
+        if len(remaining_audio) or not segments:
+            transcribe_in_background(remaining_audio)
+        for segment in segments:
+            segment.result()  # Waits for the segment, raising if it failed
+        return " ".join(text for text in transcript if text)
 
     @pyqtSlot()
     def transcribe_from_microphone(self):
         """Function called by ApplicationController. Records audio from the microphone and transcribes it."""
-        audio_data = self.record_audio()
-        transcription_text = self.transcribe_audio(audio_data)
+        if self.streaming:
+            transcription_text = self.record_and_transcribe()
+        else:
+            audio_data = self.record_audio()
+            transcription_text = self.transcribe_audio(audio_data)
+        print(f"Transcription upload: {self.upload_size} bytes, encoded in {self.encode_time * 1000:.1f} ms")
         print("User input: " + transcription_text)
         self.transcription_complete.emit(transcription_text)
@@ -0,0 +1,43 @@
+import unittest
+
+from utils.content_extractor import ContentExtractor, etree
+
+ARTICLE = ("<article><p>Councillors voted 31 to 12 in favour of the new cycle lanes on Tuesday, after a debate that "
+           "ran for more than three hours.</p><p>The first lanes, on the ring road and the two bridges, are due to "
+           "open in the spring, and the council expects the whole network to be finished by the end of next "
+           "year.</p></article>")
+NAVIGATION = '<nav><a href="/">Home</a> <a href="/news">News</a></nav>'
+
+
+def extract(html, use_lxml):
+    extractor = ContentExtractor("https://example.com/article", use_lxml=use_lxml)
+    extractor.start(headers={"Content-Type": "text/html; charset=utf-8"})
+    extractor.feed(html.encode("utf-8"))
+    return extractor.result()
+
+
+class ContentExtractorTest(unittest.TestCase):
+    def check_backends(self, html, title, kept, dropped):
+        """Checks the page with html.parser, and with lxml if it is installed."""
+        for use_lxml in (False, True) if etree is not None else (False,):
+            with self.subTest(use_lxml=use_lxml):
+                result = extract(html, use_lxml)
+                self.assertEqual(result["title"], title)
+                self.assertIn(kept, result["text"])
+                self.assertNotIn(dropped, result["text"])
+
+    def test_main_content_is_kept_and_boilerplate_dropped(self):
+        html = (f"<html><head><title>Cycle lanes</title><script>var tracking = 1;</script></head>"
+                f"<body>{NAVIGATION}{ARTICLE}</body></html>")
+        self.check_backends(html, "Cycle lanes", "Councillors voted 31 to 12", "Home")
+
+    def test_head_without_an_end_tag(self):
+        # Both the head's and the body's tags are optional, so minified pages often leave them out
+        self.check_backends(f"<html><head><title>Cycle lanes</title><body>{NAVIGATION}{ARTICLE}", "Cycle lanes",
+                            "Councillors voted 31 to 12", "Home")
+        self.check_backends(f"<html><head><title>Cycle lanes</title><style>p {{}}</style>{ARTICLE}", "Cycle lanes",
+                            "the whole network", "p {}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+
+from googleapiclient.discovery import build
+
+from benchmarks.gmail_batch_benchmark import MockGmailHttp
+from integrations.gmail import GmailClient
+from utils.settings_manager import SettingsManager
+
+
+class GmailBatchTest(unittest.TestCase):
+    """Reads emails through the real Gmail service, built from its bundled discovery document on top of MockGmailHttp."""
+
+    def setUp(self):
+        settings = mock.patch.dict(SettingsManager().settings, {"gmail_mirror_enabled": False, "gmail_batch_size": 50})
+        settings.start()
+        self.addCleanup(settings.stop)
+        sleep = mock.patch("integrations.gmail.time.sleep")  # The pause before retrying rate limited gets
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def read(self, size, headers_only=False, rate_limited=None):
+        self.http = MockGmailHttp(size, latency=0, rate_limited=rate_limited)
+        client = GmailClient(service=build("gmail", "v1", http=self.http, static_discovery=True))
+        return client.read_emails(max_results=size, headers_only=headers_only)
+
+    def test_round_trips(self):
+        # One list request, then one batch request per 50 gets
+        for size, round_trips in ((5, 2), (50, 2), (500, 11)):
+            with self.subTest(size=size):
+                emails = self.read(size)
+                self.assertEqual(len(emails), size)
+                self.assertEqual(self.http.round_trips, round_trips)
+                self.assertEqual(emails[0]["subject"], f"Message {self.http.message_ids[0]}")
+                self.assertIn("Body of message", emails[0]["content"])
+
+    def test_headers_only_requests_metadata(self):
+        emails = self.read(5, headers_only=True)
+
+        self.assertEqual({message_format for _, message_format in self.http.gets}, {"metadata"})
+        self.assertEqual([email["subject"] for email in emails],
+                         [f"Message {message_id}" for message_id in self.http.message_ids])
+        self.assertIsNone(emails[0]["content"])
+
+    def test_rate_limited_gets_are_retried_once(self):
+        message_ids = [f"{index:016x}" for index in range(5)]
+        emails = self.read(5, rate_limited={message_ids[1]: 1, message_ids[3]: 2})
+
+        # The first get succeeds on its retry, and the second is dropped after being refused twice
+        self.assertEqual([email["subject"] for email in emails],
+                         [f"Message {message_id}" for message_id in message_ids if message_id != message_ids[3]])
+        self.assertEqual([message_id for message_id, _ in self.http.gets].count(message_ids[3]), 2)
+        self.assertEqual(self.http.round_trips, 3)  # The list, the batch and the batch of retries
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from benchmarks.http_cache_benchmark import PAGE, PageServer
+from utils.http_cache import HttpCache
+from utils.http_client import HttpClient
+from utils.settings_manager import SettingsManager
+
+FETCHES = 3
+
+
+class HttpClientTest(unittest.TestCase):
+    """Fetches pages with different caching headers from a local http.server, checking what the server sees and the
+    cache's counters."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = PageServer(latency=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        settings = mock.patch.dict(SettingsManager().settings, {"http_total_timeout": 1})
+        settings.start()
+        self.addCleanup(settings.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.client = HttpClient(cache=HttpCache(directory.name))
+        self.addCleanup(self.client.session.close)
+        self.server.reset()
+
+    def fetch(self, path, fetches=FETCHES):
+        """Fetches a page repeatedly, checking its body every time, and returns the last response."""
+        for _ in range(fetches):
+            response = self.client.get(self.server.base_url + path)
+            self.assertEqual(response.content, PAGE)
+        return response
+
+    def test_fresh_pages_are_served_from_the_cache(self):
+        response = self.fetch("/max-age")
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.server.counts["requests"], 1)
+        self.assertEqual(self.client.stats()["hits"], FETCHES - 1)
+        self.assertEqual(self.client.stats()["misses"], 1)
+        self.assertEqual(self.client.stats()["bytes_saved"], (FETCHES - 1) * len(PAGE))
+
+    def test_stale_pages_are_revalidated(self):
+        connections = 0
+        for path in ("/etag", "/last-modified"):
+            with self.subTest(path=path):
+                self.server.reset()
+                response = self.fetch(path)
+
+                self.assertTrue(response.from_cache)
+                self.assertEqual(self.server.counts["requests"], FETCHES)
+                self.assertEqual(self.server.counts["not_modified"], FETCHES - 1)
+                self.assertEqual(self.server.counts["body_bytes"], len(PAGE))
+                connections += self.server.counts["connections"]
+        self.assertEqual(self.client.stats()["revalidations"], 2 * (FETCHES - 1))
+        self.assertEqual(connections, 1)  # 304s leave the connection open, so every request reuses it
+
+    def test_no_store_pages_are_never_stored(self):
+        response = self.fetch("/no-store")
+
+        self.assertFalse(response.from_cache)
+        self.assertEqual(self.server.counts["requests"], FETCHES)
+        self.assertEqual(self.server.counts["not_modified"], 0)
+        self.assertEqual(self.client.stats()["misses"], FETCHES)
+        self.assertEqual(self.client.stats()["entries"], 0)
+
+    def test_bodies_are_cut_off_at_max_bytes(self):
+        response = self.client.get(self.server.base_url + "/max-age", max_bytes=1000)
+
+        self.assertTrue(response.truncated)
+        self.assertEqual(response.content, PAGE[:1000])
+        self.assertEqual(self.client.get(self.server.base_url + "/max-age").content, PAGE)  # Fetched again in full
+
+    def test_total_timeout(self):
+        # The page trickles a byte every 0.2 seconds, so only the total timeout stops it
+        start = time.perf_counter()
+        with self.assertRaises(requests.Timeout):
+            self.client.get(self.server.base_url + "/slow")
+        self.assertLess(time.perf_counter() - start, self.client.total_timeout + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from openai.types.chat.chat_completion_chunk import (ChatCompletionChunk, Choice, ChoiceDelta, ChoiceDeltaToolCall,
+                                                     ChoiceDeltaToolCallFunction)
+
+from models.tool_call_assembler import ToolCallAssembler
+from utils.settings_manager import SettingsManager
+
+
+def chunk(index=None, call_id=None, name=None, arguments=None, content=None, finish_reason=None):
+    """Returns a streamed chat completion chunk, with a tool call delta if an index is given."""
+    tool_calls = None
+    if index is not None:
+        tool_calls = [ChoiceDeltaToolCall(index=index, id=call_id, type="function" if call_id else None,
+                                          function=ChoiceDeltaToolCallFunction(name=name, arguments=arguments))]
+    return ChatCompletionChunk(
+        id="chatcmpl-test", object="chat.completion.chunk", created=0, model="gpt-4-turbo",
+        choices=[Choice(index=0, delta=ChoiceDelta(content=content, tool_calls=tool_calls), finish_reason=finish_reason)]
+    )
+
+
+# Two tool calls, with their arguments split across deltas as the API streams them
+TWO_CALLS = [
+    chunk(content="Let me check."),
+    chunk(0, "call_emails", "get_emails", ""),
+    chunk(0, arguments='{"quan'),
+    chunk(0, arguments='tity": 2}'),
+    chunk(1, "call_page", "get_webpage_content", ""),
+    chunk(1, arguments='{"url": "https://example.com/'),
+    chunk(1, arguments='a}b"}'),
+    chunk(finish_reason="tool_calls")
+]
+
+
+class ToolCallAssemblerTest(unittest.TestCase):
+    def dispatched_after_each_chunk(self, chunks):
+        """Feeds the chunks' tool call deltas to an assembler, returning the ids of the calls completed by each."""
+        assembler = ToolCallAssembler()
+        dispatched = []
+        for streamed in chunks:
+            deltas = streamed.choices[0].delta.tool_calls
+            dispatched.append([call["id"] for call in assembler.add_deltas(deltas)] if deltas else [])
+        return assembler, dispatched
+
+    def test_calls_are_dispatched_as_soon_as_their_arguments_are_complete(self):
+        assembler, dispatched = self.dispatched_after_each_chunk(TWO_CALLS)
+
+        # The second call's arguments end with a brace inside a string, so they are only complete after the last delta
+        self.assertEqual(dispatched, [[], [], [], ["call_emails"], [], [], ["call_page"], []])
+        self.assertEqual(assembler.finish(), [])
+        self.assertEqual([call["function"] for call in assembler.ordered_tool_calls()], [
+            {"name": "get_emails", "arguments": '{"quantity": 2}'},
+            {"name": "get_webpage_content", "arguments": '{"url": "https://example.com/a}b"}'}
+        ])
+
+    def test_a_new_index_completes_the_previous_call(self):
+        assembler, dispatched = self.dispatched_after_each_chunk([
+            chunk(0, "call_exit", "exit_program", ""),
+            chunk(1, "call_files", "get_files_in_directory", '{"dir_path": "."}')
+        ])
+
+        self.assertEqual(dispatched, [[], ["call_exit", "call_files"]])
+
+    def test_finish_returns_calls_left_incomplete(self):
+        assembler, dispatched = self.dispatched_after_each_chunk([chunk(0, "call_exit", "exit_program", "")])
+
+        self.assertEqual(dispatched, [[]])
+        self.assertEqual([call["id"] for call in assembler.finish()], ["call_exit"])
+        self.assertEqual(assembler.finish(), [])
+
+
+class FakeStream:
+    """An async iterator over chunks, standing in for the stream returned by chat.completions.create."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        self.closed = True
+
+
+class StreamedToolCallTest(unittest.TestCase):
+    """Runs ResponseGenerator.stream_response against a fake stream, with a function handler that records its calls."""
+
+    def setUp(self):
+        settings = mock.patch.dict(SettingsManager().settings, {"api_key": "test", "response_cache_enabled": False})
+        settings.start()
+        self.addCleanup(settings.stop)
+        from models.response_generator import ResponseGenerator
+
+        self.calls = []
+        schemas = [{"type": "function", "function": {"name": name, "parameters": {"type": "object", "properties": {}}}}
+                   for name in ("get_emails", "get_webpage_content", "exit_program")]
+        self.model = ResponseGenerator(functions=schemas, function_handler=self.handle_function)
+        self.addCleanup(self.model.shutdown)
+
+    def handle_function(self, name, arguments):
+        self.calls.append((name, arguments))
+        return f"{name} result"
+
+    def stream(self, chunks):
+        """Streams one completion of the given chunks, returning whether it made tool calls."""
+        async def create(**kwargs):
+            return FakeStream(chunks)
+
+        self.model.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        return asyncio.run_coroutine_threadsafe(self.model.stream_response(), self.model.loop).result(timeout=5)
+
+    def test_tool_calls_and_their_results_are_added_to_the_history(self):
+        self.assertTrue(self.stream(TWO_CALLS))
+
+        self.assertEqual(self.calls, [("get_emails", '{"quantity": 2}'),
+                                      ("get_webpage_content", '{"url": "https://example.com/a}b"}')])
+        messages = self.model.message_history.to_list()[-3:]
+        self.assertEqual(messages[0]["content"], "Let me check.")
+        self.assertEqual([call["id"] for call in messages[0]["tool_calls"]], ["call_emails", "call_page"])
+        self.assertEqual([(message["tool_call_id"], message["content"]) for message in messages[1:]],
+                         [("call_emails", "get_emails result"), ("call_page", "get_webpage_content result")])
+
+    def test_stream_ending_without_a_finish_reason_still_runs_its_calls(self):
+        self.assertTrue(self.stream([chunk(0, "call_exit", "exit_program", "")]))
+
+        self.assertEqual(self.calls, [("exit_program", "")])
+        self.assertEqual(self.model.message_history.to_list()[-1]["tool_call_id"], "call_exit")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import unittest
+
+from utils.tool_registry import ToolRegistry, tool
+from utils.tool_results import CHARS_PER_TOKEN, ToolResultShaper
+
+
+def body(index, words=250):
+    return " ".join(f"email{index}word{number}" for number in range(words))
+
+
+EMAILS = [{"subject": f"Subject {index}", "sender": f"sender{index}@example.com", "content": body(index)}
+          for index in range(3)]
+
+
+@tool("Returns emails with long bodies.", budget=100)
+def get_long_emails():
+    return EMAILS
+
+
+@tool("Returns a long page.", budget=100)
+def get_long_page():
+    return {"title": "A page", "text": body(9, words=400)}
+
+
+class ToolResultPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.tools = ToolRegistry()
+        self.tools.register(get_long_emails)
+        self.tools.register(get_long_page)
+
+    def read_all_pages(self, name):
+        """Calls a tool, then follows get_more_results to the last page, returning the decoded pages."""
+        response = self.tools.call(name, "{}")
+        pages = []
+        while True:
+            self.assertLessEqual(len(response), 100 * CHARS_PER_TOKEN)
+            page = json.loads(response)
+            pages.append(page)
+            if "more" not in page:
+                return pages
+            response = self.tools.call("get_more_results", json.dumps(page["more"]))
+
+    def test_long_email_bodies_are_split_across_pages_without_losing_any_text(self):
+        pages = self.read_all_pages("get_long_emails")
+        self.assertEqual([page["page"] for page in pages], list(range(1, len(pages) + 1)))
+
+        contents = {}
+        for page in pages:
+            for part in page["content"]:
+                self.assertIsInstance(part, dict)  # Parts stay objects, not escaped JSON strings
+                self.assertEqual(part["sender"], f"sender{part['subject'][-1]}@example.com")
+                contents.setdefault(part["subject"], []).append(part)
+        for email in EMAILS:
+            parts = contents[email["subject"]]
+            self.assertGreater(len(parts), 1)
+            self.assertEqual([part["part"] for part in parts],
+                             [f"{index}/{len(parts)}" for index in range(1, len(parts) + 1)])
+            self.assertEqual(" ".join(part["content"] for part in parts), email["content"])
+
+    def test_long_dict_result_is_split_on_its_longest_string(self):
+        pages = self.read_all_pages("get_long_page")
+        self.assertGreater(len(pages), 1)
+        self.assertTrue(all(page["content"]["title"] == "A page" for page in pages))
+        self.assertEqual(" ".join(page["content"]["text"] for page in pages), body(9, words=400))
+
+    def test_short_result_is_returned_whole(self):
+        self.assertEqual(ToolResultShaper().shape("tool", {"a": 1}), '{"a":1}')
+
+    def test_unknown_handle(self):
+        response = self.tools.call("get_more_results", json.dumps({"handle": "missing-1", "page": 2}))
+        self.assertIn("No stored results", response)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import tempfile
+import unittest
+import wave
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from utils.audio_backends import WavReplayBackend
+from utils.settings_manager import SettingsManager
+
+SAMPLERATE = 16000
+PHRASE_SECONDS = 2.0
+LEAD_SECONDS = 0.5
+SETTINGS = {
+    "api_key": "test",  # The client is created, but never used, as transcribe_audio is replaced
+    "streaming_transcription": True,
+    "transcription_segment_pause_ms": 500,
+    "transcription_min_segment_seconds": 5,
+    "vad_hangover_ms": 300,
+    "vad_pre_roll_ms": 300,
+    "max_recording_seconds": 60
+}
+
+
+def write_recording(path, phrases, pause_seconds):
+    """Writes a 16-bit WAV of tones standing in for spoken phrases, separated by pauses, with silence before them.
+    Returns the position after the last phrase."""
+    phrase = 0.2 * np.sin(2 * np.pi * 220 * np.arange(int(PHRASE_SECONDS * SAMPLERATE)) / SAMPLERATE)
+    pause = np.zeros(int(pause_seconds * SAMPLERATE))
+    parts = [np.zeros(int(LEAD_SECONDS * SAMPLERATE))]
+    for _ in range(phrases):
+        parts += [phrase, pause]
+    samples = np.concatenate(parts[:-1])
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLERATE)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+    return len(samples)
+
+
+class TranscriberReplayTest(unittest.TestCase):
+    """Replays WAV recordings through the Transcriber's input stream, faster than real time, with the transcription
+    request replaced by one that records the audio it was given."""
+
+    def setUp(self):
+        settings = mock.patch.dict(SettingsManager().settings, SETTINGS)
+        settings.start()
+        self.addCleanup(settings.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def replay(self, phrases, pause_seconds):
+        """Records and transcribes a recording, returning the transcript, the recording position each segment was cut
+        at, the length of each transcribed piece of audio and the position after the last phrase."""
+        from models.transciber import Transcriber
+
+        path = self.directory / "recording.wav"
+        end_of_speech = write_recording(path, phrases, pause_seconds)
+        transcriber = Transcriber(samplerate=SAMPLERATE, audio_backend=WavReplayBackend(path, speed=50))
+        self.addCleanup(transcriber.segment_pool.shutdown)
+        cut_positions = []
+        audio_lengths = []
+
+        def transcribe_audio(audio_data, prompt=None):
+            audio_lengths.append(len(audio_data))
+            return f"segment {len(audio_lengths)}"
+
+        record_audio = transcriber.record_audio
+
+        def record_audio_with_positions(segment_callback=None):
+            def callback(audio_data):
+                cut_positions.append(transcriber.detector.position)
+                segment_callback(audio_data)
+            return record_audio(segment_callback=callback)
+
+        with mock.patch.object(transcriber, "transcribe_audio", transcribe_audio), \
+                mock.patch.object(transcriber, "record_audio", record_audio_with_positions):
+            transcript = transcriber.record_and_transcribe()
+        self.transcriber = transcriber
+        return transcript, cut_positions, audio_lengths, end_of_speech
+
+    def test_long_pauses_are_transcribed_while_recording(self):
+        transcript, cut_positions, audio_lengths, end_of_speech = self.replay(phrases=3, pause_seconds=1.0)
+
+        self.assertEqual(len(cut_positions), 1)
+        self.assertLess(cut_positions[0], end_of_speech)  # Cut at the second pause, while the user is still speaking
+        self.assertEqual(transcript, "segment 1 segment 2")
+
+        # The segments join up, and cover the speech with its pre-roll and hangover, each end rounded out to a frame
+        detector = self.transcriber.detector
+        expected = end_of_speech + detector.hangover - (int(LEAD_SECONDS * SAMPLERATE) - detector.pre_roll)
+        self.assertAlmostEqual(sum(audio_lengths), expected, delta=2 * detector.frame_length)
+
+    def test_short_pauses_are_not_cut(self):
+        transcript, cut_positions, audio_lengths, end_of_speech = self.replay(phrases=3, pause_seconds=0.4)
+
+        self.assertTrue(all(position > end_of_speech for position in cut_positions))
+        self.assertEqual(len(audio_lengths), 1)
+        self.assertEqual(transcript, "segment 1")
+
+    def test_recording_stops_after_the_required_silence(self):
+        self.replay(phrases=1, pause_seconds=0)
+
+        # A second of silence, plus a fifth of the speech's length, without waiting for the hangover as well
+        required_silence = 1 + PHRASE_SECONDS * 0.2
+        end_of_speech = (LEAD_SECONDS + PHRASE_SECONDS) * SAMPLERATE
+        silence = (self.transcriber.detector.position - end_of_speech) / SAMPLERATE
+        self.assertGreaterEqual(silence, required_silence)
+        self.assertLess(silence, required_silence + 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import threading
+import time
+import wave
+
+import numpy as np
+
+from utils.settings_manager import SettingsManager
+
+
+class AudioBackend:
+    """
+    Opens the input and output streams used for recording and playback.
+
+    Streams follow sounddevice's interface: input callbacks get float32 blocks shaped (frames, channels), output
+    callbacks fill a buffer of 16-bit samples, and streams are started and stopped explicitly or used as context
+    managers. Timing hooks added with add_hook() are called with the event name, a perf_counter() timestamp and the
+    block, for every block passed through either kind of stream.
+    """
+
+    def __init__(self):
+        self.hooks = []
+
+    def add_hook(self, hook):
+        """Registers a function called as hook(event, timestamp, block) for every "input" and "output" block."""
+        self.hooks.append(hook)
+
+    def run_hooks(self, event, block):
+        timestamp = time.perf_counter()
+        for hook in self.hooks:
+            hook(event, timestamp, block)
+
+    def input_stream(self, samplerate, channels, callback):
+        """Returns an unstarted stream that calls callback(indata, frames, time_info, status) with recorded audio."""
+        def hooked_callback(indata, frames, time_info, status):
+            callback(indata, frames, time_info, status)
+            self.run_hooks("input", indata)
+        return self.open_input(samplerate, channels, hooked_callback if self.hooks else callback)
+
+    def output_stream(self, samplerate, channels, callback):
+        """Returns an unstarted stream that calls callback(outdata, frames, time_info, status) to fill each block."""
+        def hooked_callback(outdata, frames, time_info, status):
+            callback(outdata, frames, time_info, status)
+            self.run_hooks("output", outdata)
+        return self.open_output(samplerate, channels, hooked_callback if self.hooks else callback)
+
+    def open_input(self, samplerate, channels, callback):
+        raise NotImplementedError
+
+    def open_output(self, samplerate, channels, callback):
+        raise NotImplementedError
+
+
+class SoundDeviceBackend(AudioBackend):
+    """Records from and plays through the system's audio devices."""
+
+    def open_input(self, samplerate, channels, callback):
+        import sounddevice as sd  # Imported here, as it fails to load on machines without PortAudio
+        return sd.InputStream(samplerate=samplerate, channels=channels, dtype='float32', callback=callback)
+
+    def open_output(self, samplerate, channels, callback):
+        import sounddevice as sd
+        return sd.RawOutputStream(samplerate=samplerate, channels=channels, dtype='int16', callback=callback)
+
+
+class SimulatedStream:
+    """A stream that calls its callback from a thread, one block at a time, paced at `speed` times real time."""
+
+    def __init__(self, samplerate, blocksize, speed, fill_block):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.speed = speed
+        self.fill_block = fill_block  # Called with the block number, runs the stream's callback for that block
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="simulated-audio", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        start = time.perf_counter()
+        block_number = 0
+        while not self.stopped.is_set():
+            self.fill_block(block_number)
+            block_number += 1
+            # Sleep until this block would have finished playing, so pacing doesn't drift
+            delay = start + block_number * self.blocksize / (self.samplerate * self.speed) - time.perf_counter()
+            if delay > 0:
+                self.stopped.wait(delay)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def close(self):
+        self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NullBackend(AudioBackend):
+    """Records silence and discards playback, paced at `speed` times real time, for running without audio devices."""
+
+    def __init__(self, speed=1.0, blocksize=1024):
+        super().__init__()
+        self.speed = speed
+        self.blocksize = blocksize
+
+    def open_input(self, samplerate, channels, callback):
+        def fill_block(block_number):
+            callback(np.zeros((self.blocksize, channels), dtype=np.float32), self.blocksize, None, None)
+        return SimulatedStream(samplerate, self.blocksize, self.speed, fill_block)
+
+    def open_output(self, samplerate, channels, callback):
+        def fill_block(block_number):
+            callback(bytearray(self.blocksize * channels * 2), self.blocksize, None, None)
+        return SimulatedStream(samplerate, self.blocksize, self.speed, fill_block)
+
+
+def read_wav(path):
+    """Reads a 16-bit PCM WAV file, returning float32 samples shaped (frames, channels) and the sample rate."""
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path} is not a 16-bit PCM WAV file")
+        frames = wav.readframes(wav.getnframes())
+        samples = np.frombuffer(frames, dtype="<i2").reshape(-1, wav.getnchannels())
+        return samples.astype(np.float32) / 32768, wav.getframerate()
+
+
+class WavReplayBackend(NullBackend):
+    """
+    Replays a recording as if it were coming from the microphone, followed by silence, and discards playback.
+
+    The recording is given as samples, or read from a WAV file, and must be at the sample rate the input stream is
+    opened with. Each input stream starts the recording from the beginning.
+    """
+
+    def __init__(self, recording, samplerate=None, speed=1.0, blocksize=1024):
+        super().__init__(speed=speed, blocksize=blocksize)
+        if isinstance(recording, np.ndarray):
+            self.recording, self.samplerate = recording.astype(np.float32), samplerate
+        else:
+            self.recording, self.samplerate = read_wav(recording)
+        if self.recording.ndim == 1:
+            self.recording = self.recording.reshape(-1, 1)
+
+    def open_input(self, samplerate, channels, callback):
+        if self.samplerate is not None and self.samplerate != samplerate:
+            raise ValueError(f"The recording is {self.samplerate} Hz, but the stream was opened at {samplerate} Hz")
+        recording = self.recording[:, :channels] if self.recording.shape[1] >= channels else \
+            np.repeat(self.recording[:, :1], channels, axis=1)
+
+        def fill_block(block_number):
+            block = recording[block_number * self.blocksize:(block_number + 1) * self.blocksize]
+            if len(block) < self.blocksize:  # Silence once the recording has finished
+                block = np.concatenate((block, np.zeros((self.blocksize - len(block), channels), dtype=np.float32)))
+            callback(block, self.blocksize, None, None)
+        return SimulatedStream(samplerate, self.blocksize, self.speed, fill_block)
+
+
+_backend = None
+_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the process-wide audio backend chosen by the audio_backend setting, creating it on first use.
+    The setting is "sounddevice" (the default), "null", or "replay", which replays the audio_replay_file WAV."""
+    global _backend
+    with _lock:
+        if _backend is None:
+            settings_manager = SettingsManager()
+            name = settings_manager.get_setting("audio_backend", "sounddevice")
+            speed = settings_manager.get_setting("audio_backend_speed", 1.0)
+            if name == "null":
+                _backend = NullBackend(speed=speed)
+            elif name == "replay":
+                _backend = WavReplayBackend(settings_manager.get_setting("audio_replay_file"), speed=speed)
+            else:
+                _backend = SoundDeviceBackend()
+        return _backend
+
+
+def set_backend(backend):
+    """Replaces the process-wide audio backend, for benchmarks and offline runs. Must be called before any audio
+    component is created."""
+    global _backend
+    with _lock:
+        _backend = backend
@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    A fixed-size buffer of the most recent mono float32 samples, written by an audio callback and read by position.
+
+    Positions count every sample ever written, so readers can keep their place while the buffer wraps around. Only the
+    last `capacity` samples can be read back.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = np.zeros(capacity, dtype=np.float32)
+        self.written = 0  # Total samples written
+        self.condition = threading.Condition()
+
+    def write(self, block):
+        """Copies a block of samples into the buffer, overwriting the oldest, and wakes any waiting readers."""
+        block = block[-self.capacity:]
+        with self.condition:
+            start = self.written % self.capacity
+            first = min(len(block), self.capacity - start)
+            self.samples[start:start + first] = block[:first]
+            self.samples[:len(block) - first] = block[first:]
+            self.written += len(block)
+            self.condition.notify_all()
+
+    def wait(self, position, timeout=None):
+        """Waits until samples past the given position have been written, and returns the number written."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.written > position, timeout)
+            return self.written
+
+    def read(self, start, end):
+        """Returns a copy of the samples between two positions, clipped to what is still in the buffer."""
+        with self.condition:
+            start = max(start, self.written - self.capacity, 0)
+            end = min(end, self.written)
+            if end <= start:
+                return np.zeros(0, dtype=np.float32)
+            first, last = start % self.capacity, end % self.capacity
+            if first < last:
+                return self.samples[first:last].copy()
+            return np.concatenate((self.samples[first:], self.samples[:last]))
+
+    def clear(self):
+        """Forgets everything written so far."""
+        with self.condition:
+            self.written = 0
@@ -0,0 +1,57 @@
+import io
+import math
+import wave
+
+import numpy as np
+from scipy.signal import resample_poly
+
+
+def to_mono(samples):
+    """Mixes multichannel samples, shaped (frames, channels), down to one channel."""
+    samples = np.asarray(samples, dtype=np.float32)
+    return samples.mean(axis=1) if samples.ndim == 2 else samples
+
+
+def resample(samples, samplerate, target_samplerate):
+    """Resamples mono samples with a polyphase filter, which also removes frequencies the new rate can't hold."""
+    if samplerate == target_samplerate:
+        return samples
+    divisor = math.gcd(samplerate, target_samplerate)
+    return resample_poly(samples, target_samplerate // divisor, samplerate // divisor).astype(np.float32)
+
+
+def trim_silence(samples, samplerate, threshold=0.01, padding=0.2, frame_duration=0.03):
+    """Removes quiet audio from the start and end, keeping `padding` seconds around the loud part. Audio that is quiet
+    throughout is returned unchanged."""
+    frame_length = max(1, int(samplerate * frame_duration))
+    frame_count = len(samples) // frame_length
+    if not frame_count:
+        return samples
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    loud = np.flatnonzero(np.sqrt(np.mean(np.square(frames), axis=1)) > threshold)
+    if not len(loud):
+        return samples
+    start = max(0, loud[0] * frame_length - int(padding * samplerate))
+    end = min(len(samples), (loud[-1] + 1) * frame_length + int(padding * samplerate))
+    return samples[start:end]
+
+
+def encode_wav(samples, samplerate, name="speech.wav"):
+    """Encodes mono float samples as a 16-bit PCM WAV file in memory, named so it can be uploaded directly."""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    file = io.BytesIO()
+    with wave.open(file, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(samplerate)
+        wav.writeframes(pcm.tobytes())
+    file.seek(0)
+    file.name = name
+    return file
+
+
+def encode_speech(samples, samplerate, target_samplerate=16000, silence_threshold=0.01):
+    """Prepares recorded speech for upload: mono, trimmed of silence, resampled and encoded as 16-bit WAV."""
+    mono = to_mono(samples)
+    trimmed = trim_silence(mono, samplerate, threshold=silence_threshold)
+    return encode_wav(resample(trimmed, samplerate, target_samplerate), target_samplerate)
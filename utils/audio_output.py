@@ -0,0 +1,113 @@
+import threading
+
+from utils import audio_backends
+
+
+class AudioOutput:
+    """
+    Plays raw 16-bit PCM through a single long-lived output stream, fed from a fixed-size ring buffer.
+
+    Writers block while the buffer is full, and the stream plays silence while it is empty, so clips written back to
+    back play without gaps, and nothing needs to be decoded or written to disk. The stream is opened once, stopped
+    with stop() when playback has finished, so the device isn't kept busy between responses, and started again by the
+    next write.
+    """
+
+    def __init__(self, samplerate=24000, channels=1, buffer_seconds=0.5, backend=None):
+        self.backend = backend or audio_backends.get_backend()
+        self.samplerate = samplerate
+        self.channels = channels
+        self.frame_size = 2 * channels  # Bytes per frame of 16-bit samples
+        self.capacity = int(samplerate * buffer_seconds) * self.frame_size
+        self.buffer = bytearray(self.capacity)
+        self.read_position = 0
+        self.size = 0  # Bytes waiting to be played
+        self.generation = 0  # Incremented by clear(), so blocked writers know their audio was dropped
+        self.condition = threading.Condition()
+        # Held while starting, stopping or writing to the stream, so stop() never stops it under a writer. Separate from
+        # the condition, as stopping a stream waits for its callback, which takes the condition.
+        self.stream_lock = threading.RLock()
+        self.stream = None
+        self.active = False  # Whether the stream is started
+
+    def start(self):
+        """Opens the output stream if it is not already open, and starts it if it is stopped."""
+        with self.stream_lock:
+            if self.stream is None:
+                self.stream = self.backend.output_stream(self.samplerate, self.channels, self.callback)
+            if not self.active:
+                self.stream.start()
+                self.active = True
+
+    def stop(self):
+        """Stops the output stream if nothing is left to play. It stays open, to be started again by the next write."""
+        with self.stream_lock:
+            with self.condition:
+                if self.size or not self.active:
+                    return
+            self.stream.stop()
+            self.active = False
+
+    def write(self, data):
+        """Queues audio for playback, blocking while the buffer is full.
+        Returns False if clear() was called before all of it was queued."""
+        with self.stream_lock:
+            self.start()
+            return self.write_to_buffer(memoryview(data))
+
+    def write_to_buffer(self, data):
+        """Copies audio into the ring buffer as space frees up, returning False if clear() was called first."""
+        with self.condition:
+            generation = self.generation
+            while data:
+                while self.size == self.capacity and generation == self.generation:
+                    self.condition.wait()
+                if generation != self.generation:
+                    return False
+                write_position = (self.read_position + self.size) % self.capacity
+                count = min(len(data), self.capacity - self.size, self.capacity - write_position)
+                self.buffer[write_position:write_position + count] = data[:count]
+                self.size += count
+                data = data[count:]
+        return True
+
+    def write_silence(self, seconds):
+        """Queues a pause of the given length."""
+        return self.write(bytes(int(self.samplerate * seconds) * self.frame_size))
+
+    def callback(self, outdata, frames, time, status):
+        """Called by the output stream on its audio thread to fill the next block of output."""
+        requested = len(outdata)
+        with self.condition:
+            count = min(requested, self.size - self.size % self.frame_size)
+            first = min(count, self.capacity - self.read_position)
+            outdata[:first] = self.buffer[self.read_position:self.read_position + first]
+            outdata[first:count] = self.buffer[:count - first]
+            self.read_position = (self.read_position + count) % self.capacity
+            self.size -= count
+            self.condition.notify_all()
+        outdata[count:] = bytes(requested - count)  # Play silence if the buffer runs dry
+
+    def drain(self):
+        """Blocks until everything queued has been played, or clear() is called."""
+        with self.condition:
+            generation = self.generation
+            while self.size and generation == self.generation and self.active:
+                self.condition.wait(0.5)
+
+    def clear(self):
+        """Drops all queued audio immediately, and releases any blocked writers."""
+        with self.condition:
+            self.size = 0
+            self.generation += 1
+            self.condition.notify_all()
+
+    def close(self):
+        """Stops and closes the output stream."""
+        self.clear()
+        with self.stream_lock:
+            stream, self.stream = self.stream, None
+            self.active = False
+            if stream is not None:
+                stream.stop()
+                stream.close()
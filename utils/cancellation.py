@@ -0,0 +1,35 @@
+import threading
+
+
+class CancellationToken:
+    """
+    Cancels the assistant's current turn across threads.
+
+    Components register callbacks that stop their work when cancel() is called. Each cancellation also starts a new
+    turn number, so work that was started before a cancellation can tell that its results are no longer wanted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turn = 0
+        self.callbacks = []
+
+    def add_callback(self, callback):
+        """Registers a callback to run, on the cancelling thread, whenever the turn is cancelled."""
+        with self.lock:
+            self.callbacks.append(callback)
+
+    def cancel(self):
+        """Cancels the current turn and runs every registered callback."""
+        with self.lock:
+            self.turn += 1
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error while cancelling: {e}")
+
+    def is_cancelled(self, turn):
+        """Checks whether the given turn number has since been cancelled."""
+        return turn != self.turn
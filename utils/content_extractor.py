@@ -0,0 +1,320 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+try:
+    from lxml import etree  # Optional: parses several times faster than html.parser
+except ImportError:
+    etree = None
+
+DROPPED_TAGS = {"script", "style", "noscript", "template", "svg", "math", "head", "iframe", "canvas", "select",
+                "button"}
+HEAD_TAGS = {"title", "meta", "link", "style", "script", "noscript", "base", "template"}  # Tags that can be in the head
+UNLIKELY_TAGS = {"nav", "header", "footer", "aside", "form"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track",
+             "wbr"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "h1", "h2", "h3", "h4",
+              "h5", "h6", "pre", "blockquote", "figcaption", "table", "tr", "td", "th", "body", "html"}
+PARAGRAPH_TAGS = {"p", "li", "dt", "dd", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "figcaption", "td",
+                  "th"}
+# Patterns from Readability. Unlikely candidates are set aside unless they also look like content, and the positive
+# and negative patterns raise or lower the score of an element whose class or id matches them
+UNLIKELY_CANDIDATES = re.compile(r"-ad-|ai2html|banner|breadcrumbs|combx|comment|community|cover-wrap|disqus|extra|"
+                                 r"footer|gdpr|header|legends|menu|related|remark|replies|rss|shoutbox|sidebar|"
+                                 r"skyscraper|social|sponsor|supplemental|ad-break|agegate|pagination|pager|popup|"
+                                 r"yom-remote|cookie|consent", re.IGNORECASE)
+MAYBE_CANDIDATE = re.compile(r"and|article|body|column|content|main|shadow", re.IGNORECASE)
+POSITIVE = re.compile(r"article|body|content|entry|hentry|h-entry|main|page|pagination|post|text|blog|story",
+                      re.IGNORECASE)
+NEGATIVE = re.compile(r"-ad-|hidden|^hid$| hid$| hid |^hid |banner|combx|comment|com-|contact|footer|gdpr|masthead|"
+                      r"media|meta|outbrain|promo|related|scroll|share|shoutbox|sidebar|skyscraper|sponsor|shopping|"
+                      r"tags|tool|widget", re.IGNORECASE)
+UNLIKELY_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "menu", "menubar", "dialog"}
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+MIN_PARAGRAPH_LENGTH = 25  # Shorter blocks, like captions and buttons, don't count towards a container's score
+MIN_ARTICLE_LENGTH = 200  # Less main content than this, and the whole page is returned instead
+
+
+class Element:
+    """An open element, and the scores Readability gives it as a candidate for the main content."""
+    __slots__ = ("tag", "parent", "weight", "dropped", "unlikely", "score", "text_length", "link_length")
+
+    def __init__(self, tag, parent, weight, dropped=False, unlikely=False):
+        self.tag = tag
+        self.parent = parent
+        self.weight = weight  # From its class and id
+        self.dropped = dropped  # Whether it is a script, style or hidden element, whose text is never kept
+        self.unlikely = unlikely  # Whether it, or an element it is inside, is an unlikely candidate
+        self.score = 0.0
+        self.text_length = 0
+        self.link_length = 0  # Characters of text inside links
+
+    def final_score(self):
+        """Returns the element's score, discounted by how much of its text is links."""
+        link_density = self.link_length / self.text_length if self.text_length else 1
+        return (self.score + self.weight) * (1 - link_density)
+
+
+class Block:
+    """A run of text, such as a paragraph or list item, and the element that contains it."""
+    __slots__ = ("text", "element")
+
+    def __init__(self, text, element):
+        self.text = text
+        self.element = element
+
+
+def class_weight(tag, attributes):
+    """Returns Readability's weight for an element: 25 for each of its class and id that look like content, minus 25
+    for each that look like boilerplate, with a little extra for article and main elements."""
+    weight = 5 if tag in ("article", "main") else 0
+    for name in ("class", "id"):
+        value = attributes.get(name)
+        if value:
+            weight += (25 if POSITIVE.search(value) else 0) - (25 if NEGATIVE.search(value) else 0)
+    return weight
+
+
+def is_unlikely(tag, attributes):
+    """Returns whether an element looks like navigation, comments or other boilerplate, as Readability's unlikely
+    candidates do."""
+    if tag in ("html", "body", "main", "article", "a"):
+        return False
+    if tag in UNLIKELY_TAGS or attributes.get("role") in UNLIKELY_ROLES:
+        return True
+    identifier = " ".join(filter(None, (attributes.get("class"), attributes.get("id"))))
+    return bool(UNLIKELY_CANDIDATES.search(identifier)) and not MAYBE_CANDIDATE.search(identifier)
+
+
+class ContentExtractor:
+    """
+    Extracts the title, main text and links of a page, parsing it incrementally as it is fed.
+
+    Scripts, styles and hidden elements are dropped while parsing. The rest of the text is split into blocks. Blocks
+    in navigation, headers, footers, forms and Readability's unlikely candidates are set aside, and each remaining
+    container is scored from the paragraphs inside it as Readability does: a point per paragraph, per comma and per
+    100 characters, given fully to the paragraph's container and half to the container's parent, plus its class
+    weight, then discounted by link density. The blocks inside the best container are the main content, less those
+    inside descendants that score below zero. If that is too short to be an article, the whole page is returned,
+    including the blocks set aside. Uses lxml if it is installed, and html.parser otherwise.
+
+    Feed it with start(url, headers), feed(chunk) for each chunk of the body, then call result().
+    """
+
+    def __init__(self, url="", use_lxml=True):
+        self.url = url
+        self.use_lxml = use_lxml and etree is not None
+        self.parser = None
+        self.decoder = None
+        self.stack = [Element("#root", None, 0)]
+        self.drop_depth = 0  # How many dropped elements are open, so text is discarded while it is positive
+        self.text = []
+        self.link_text_length = 0
+        self.link = None  # The href and text of the open link
+        self.blocks = []
+        self.links = []  # (element, name, url)
+        self.title = []
+        self.in_title = False
+
+    def start(self, url=None, headers=None):
+        """Prepares to parse a body, resolving links against its URL and using the charset from its Content-Type
+        header if it has one."""
+        self.url = url or self.url
+        content_type = (headers or {}).get("Content-Type", "")
+        match = re.search(r"charset=([\w-]+)", content_type)
+        if match:
+            self.set_charset(match.group(1))
+        if self.use_lxml:
+            self.parser = etree.HTMLParser(target=LxmlTarget(self), recover=True, no_network=True)
+        else:
+            self.parser = StreamingParser(self)
+
+    def set_charset(self, charset):
+        try:
+            self.decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        except LookupError:
+            self.decoder = None
+
+    def feed(self, chunk):
+        """Parses the next chunk of the body, in bytes."""
+        if self.parser is None:
+            self.start()
+        if self.decoder is None:
+            match = META_CHARSET.search(chunk[:4096])  # Pages declare their charset near the start
+            self.set_charset(match.group(1).decode("ascii") if match else "utf-8")
+            if self.decoder is None:
+                self.set_charset("utf-8")
+        self.parser.feed(self.decoder.decode(chunk))
+
+    def close(self):
+        if self.parser is None:
+            return
+        if self.decoder:
+            self.parser.feed(self.decoder.decode(b"", final=True))
+        self.parser.close()
+        self.parser = None
+
+    def handle_start(self, tag, attributes):
+        tag = tag.lower()
+        if tag == "title":
+            self.in_title = True
+        if tag in VOID_TAGS:
+            if tag == "br" and not self.drop_depth:
+                self.text.append("\n")
+            return
+        if self.drop_depth and tag not in HEAD_TAGS and any(element.tag == "head" for element in self.stack):
+            self.handle_end("head")  # The head's end tag is optional, and html.parser doesn't close it implicitly
+        parent = self.stack[-1]
+        if self.drop_depth or tag in DROPPED_TAGS or "hidden" in attributes or attributes.get("aria-hidden") == "true":
+            self.drop_depth += 1
+            self.stack.append(Element(tag, parent, 0, dropped=True))
+            return
+        unlikely = parent.unlikely or is_unlikely(tag, attributes)
+        # Inside an unlikely candidate every element is tracked, so it ends exactly where its end tag is
+        if tag in BLOCK_TAGS or unlikely:
+            if tag == "p" and parent.tag == "p":
+                self.handle_end("p")  # html.parser doesn't close paragraphs implicitly
+                parent = self.stack[-1]
+            if tag in BLOCK_TAGS or unlikely != parent.unlikely:
+                self.flush()
+            self.stack.append(Element(tag, parent, class_weight(tag, attributes), unlikely=unlikely))
+        if tag == "a" and attributes.get("href"):
+            self.link = [attributes["href"], []]
+
+    def handle_end(self, tag):
+        tag = tag.lower()
+        if tag == "title":
+            self.in_title = False
+        if tag == "a" and self.link:
+            name = WHITESPACE.sub(" ", "".join(self.link[1])).strip()
+            self.links.append((self.stack[-1], name, urljoin(self.url, self.link[0])))
+            self.link = None
+        if tag in VOID_TAGS:
+            return
+        # Close up to the matching element, ignoring end tags for elements that aren't open
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                break
+        else:
+            return
+        element = self.stack[index]
+        if not self.drop_depth and (tag in BLOCK_TAGS or element.unlikely != element.parent.unlikely):
+            self.flush()
+        while len(self.stack) > index:
+            if self.stack.pop().dropped:
+                self.drop_depth -= 1
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title.append(data)
+        if self.drop_depth:
+            return
+        self.text.append(data)
+        if self.link:
+            self.link[1].append(data)
+            self.link_text_length += len(data.strip())
+
+    def flush(self):
+        """Ends the current block of text, adding it to the scores of its containers unless it is unlikely content."""
+        text = WHITESPACE.sub(" ", "".join(self.text)).strip()
+        link_length = self.link_text_length
+        self.text = []
+        self.link_text_length = 0
+        if not text:
+            return
+        element = self.stack[-1]
+        self.blocks.append(Block(text, element))
+        if element.unlikely:
+            return
+
+        ancestor = element
+        while ancestor:
+            ancestor.text_length += len(text)
+            ancestor.link_length += link_length
+            ancestor = ancestor.parent
+        if len(text) < MIN_PARAGRAPH_LENGTH:
+            return
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        container = element.parent if element.tag in PARAGRAPH_TAGS else element
+        if container:
+            container.score += score
+            if container.parent:
+                container.parent.score += score / 2
+
+    def result(self):
+        """Finishes parsing, and returns the page's title, main text and the links within it."""
+        self.close()
+        self.flush()
+        scored = {block.element for block in self.blocks if not block.element.unlikely}
+        scored |= {element.parent for element in scored if element.parent}
+        scored |= {element.parent for element in scored if element.parent}
+        best = max(scored, key=Element.final_score, default=None)
+
+        def in_main_content(element):
+            """Whether an element is inside the best candidate, and not inside a descendant that scores below zero."""
+            if element.unlikely:
+                return False
+            while element:
+                if element is best:
+                    return True
+                if element.weight + element.score < 0:
+                    return False
+                element = element.parent
+            return False
+
+        blocks = [block.text for block in self.blocks if in_main_content(block.element)]
+        links = [{"name": name, "url": url} for element, name, url in self.links if in_main_content(element)]
+        if len(" ".join(blocks)) < MIN_ARTICLE_LENGTH:  # Too little to be an article, so return the whole page
+            blocks = [block.text for block in self.blocks]
+            links = [{"name": name, "url": url} for _, name, url in self.links]
+        return {
+            "title": WHITESPACE.sub(" ", "".join(self.title)).strip(),
+            "text": "\n".join(blocks),
+            "links": links
+        }
+
+
+class StreamingParser(HTMLParser):
+    """Passes html.parser's events to a ContentExtractor."""
+
+    def __init__(self, extractor):
+        super().__init__(convert_charrefs=True)
+        self.extractor = extractor
+
+    def handle_starttag(self, tag, attrs):
+        self.extractor.handle_start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.extractor.handle_end(tag)
+
+    def handle_endtag(self, tag):
+        self.extractor.handle_end(tag)
+
+    def handle_data(self, data):
+        self.extractor.handle_data(data)
+
+
+class LxmlTarget:
+    """Passes lxml's parser target events to a ContentExtractor."""
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+
+    def start(self, tag, attrib):
+        self.extractor.handle_start(tag, dict(attrib))
+
+    def end(self, tag):
+        self.extractor.handle_end(tag)
+
+    def data(self, data):
+        self.extractor.handle_data(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+def hash_key(*parts):
+    """Returns a stable hash of any JSON serialisable values, for use as a cache key."""
+    serialised = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialised.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    A size-bounded key/value cache of bytes stored as files in a directory, with LRU eviction and an optional time to live.
+
+    Each entry's modification time records when it was written, and its access time records when it was last used,
+    so the LRU order and expiry survive restarts.
+    """
+
+    def __init__(self, directory, max_bytes, ttl=None, suffix=".bin"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # Seconds an entry stays valid after being written, or None to keep entries until evicted
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.entries = OrderedDict()  # Key to size in bytes, least recently used first
+        self.total_bytes = 0
+        self.load_index()
+
+    def load_index(self):
+        """Rebuilds the LRU index from the files in the cache directory."""
+        files = []
+        for path in self.directory.glob("*" + self.suffix):
+            stat = path.stat()
+            files.append((stat.st_atime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def path_for(self, key):
+        return self.directory / (key + self.suffix)
+
+    def get(self, key):
+        """Returns the cached bytes for a key, or None if the key is missing or expired."""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            path = self.path_for(key)
+            try:
+                if self.ttl is not None and time.time() - path.stat().st_mtime > self.ttl:
+                    self.remove(key)
+                    self.misses += 1
+                    return None
+                data = path.read_bytes()
+                os.utime(path, (time.time(), path.stat().st_mtime))  # Mark as recently used, keeping the write time
+            except OSError:
+                self.remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        """Stores bytes under a key, evicting the least recently used entries if the cache is over its size limit."""
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            path = self.path_for(key)
+            temp_path = path.with_suffix(".tmp")
+            try:
+                temp_path.write_bytes(data)
+                os.replace(temp_path, path)  # Replace atomically so a crash never leaves a partial entry
+            except OSError as e:
+                print(f"Error writing to cache: {e}")
+                return
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        """Removes an entry. The lock must be held by the caller."""
+        self.total_bytes -= self.entries.pop(key, 0)
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        """Returns the cache's hit and miss counters and current size."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes
+            }
@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from utils.disk_cache import DiskCache, hash_key
+
+STORED_HEADERS = ["Content-Type", "Cache-Control", "Expires", "Date", "Last-Modified", "ETag", "Age"]
+MAX_HEURISTIC_LIFETIME = 24 * 60 * 60  # Seconds a response without explicit freshness can be reused for, at most
+
+
+def parse_cache_control(value):
+    """Returns the directives of a Cache-Control header as a dict, with None for directives without a value."""
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def parse_date(value):
+    """Returns an HTTP date as a timestamp, or None if it is missing or malformed."""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now):
+    """
+    Returns how many seconds a response stays fresh from now, following RFC 9111 for a private cache.
+
+    Uses max-age, then Expires, then 10% of the time since Last-Modified, capped at a day. Returns None if the response
+    must not be stored at all.
+    """
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives or headers.get("Vary", "").strip() == "*":
+        return None
+    if "no-cache" in directives:
+        return 0
+    age = int(headers.get("Age", 0)) if str(headers.get("Age", "")).isdigit() else 0
+    date = parse_date(headers.get("Date")) or now
+    if "max-age" in directives:
+        try:
+            return max(int(directives["max-age"]) - age, 0)
+        except (TypeError, ValueError):
+            return 0  # A malformed max-age means the response is stale
+    if "Expires" in headers:
+        expires = parse_date(headers.get("Expires"))  # An invalid date means the response has already expired
+        return max((expires or 0) - date - age, 0)
+    last_modified = parse_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        return max(min((date - last_modified) / 10, MAX_HEURISTIC_LIFETIME) - age, 0)
+    return 0
+
+
+class CachedResponse:
+    """A response body with its headers, as stored in the HTTP cache."""
+
+    def __init__(self, url, headers, content, expires, from_cache=False, truncated=False):
+        self.url = url
+        self.headers = headers
+        self.content = content
+        self.expires = expires  # Timestamp after which the response must be revalidated
+        self.from_cache = from_cache
+        self.truncated = truncated  # Whether the body was cut off at a size limit
+
+    @property
+    def is_fresh(self):
+        return time.time() < self.expires
+
+    @property
+    def validators(self):
+        """Returns the conditional request headers that revalidate this response, if it has an ETag or Last-Modified."""
+        validators = {}
+        if self.headers.get("ETag"):
+            validators["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+
+class HttpCache:
+    """
+    Caches GET responses on disk, keyed on their URL, for as long as their Cache-Control, Expires or Last-Modified
+    headers allow.
+
+    Each entry is one line of JSON metadata followed by the body, in a DiskCache, so the cache is bounded in size with
+    LRU eviction. Stale entries are kept, so they can be revalidated with a conditional request instead of being
+    fetched again.
+    """
+
+    def __init__(self, directory="cache/http", max_bytes=20 * 1024 * 1024):
+        self.store = DiskCache(directory, max_bytes, suffix=".http")
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.bytes_saved = 0  # Body bytes served from the cache instead of the network
+
+    @staticmethod
+    def key(url):
+        return hash_key("GET", url)
+
+    def get(self, url):
+        """Returns the stored response for a URL, fresh or stale, or None if there isn't one."""
+        data = self.store.get(self.key(url))
+        if data is None:
+            return None
+        metadata, _, content = data.partition(b"\n")
+        metadata = json.loads(metadata)
+        return CachedResponse(metadata["url"], metadata["headers"], content, metadata["expires"], from_cache=True,
+                              truncated=metadata.get("truncated", False))
+
+    def set(self, url, response_url, headers, content, truncated=False):
+        """Stores a response if its headers allow it, returning it as a CachedResponse. A truncated body is stored as
+        is, since it is all that is read of the page until the size limit is raised."""
+        now = time.time()
+        lifetime = freshness_lifetime(headers, now)
+        headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        response = CachedResponse(response_url, headers, content, now + (lifetime or 0), truncated=truncated)
+        if lifetime is not None:
+            metadata = json.dumps({"url": response_url, "headers": headers, "expires": response.expires,
+                                   "truncated": truncated})
+            self.store.set(self.key(url), metadata.encode("utf-8") + b"\n" + content)
+        return response
+
+    def revalidated(self, url, cached, headers):
+        """Updates a stored response from the headers of a 304 Not Modified, returning the refreshed response."""
+        merged = {**cached.headers, **{name: headers[name] for name in STORED_HEADERS if name in headers}}
+        response = self.set(url, cached.url, merged, cached.content, cached.truncated)
+        response.from_cache = True
+        self.record("revalidations", len(cached.content))
+        return response
+
+    def record(self, counter, bytes_saved=0):
+        """Counts a hit, revalidation or miss."""
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.bytes_saved += bytes_saved
+
+    def stats(self):
+        """Returns the hit, revalidation and miss counters, the bytes they saved and the store's size."""
+        store_stats = self.store.stats()
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "revalidations": self.revalidations,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "entries": store_stats["entries"],
+                "bytes": store_stats["bytes"],
+                "evictions": store_stats["evictions"]
+            }
@@ -0,0 +1,116 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+from utils.http_cache import CachedResponse, HttpCache
+from utils.settings_manager import SettingsManager
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HttpClient:
+    """
+    Fetches pages over one pooled requests.Session, with strict timeouts and an on-disk HTTP cache.
+
+    Connections are kept alive and reused across tool calls. The connect and read timeouts bound each step of a
+    request, and the total timeout bounds the whole download, so a host that trickles its response can't stall a tool.
+    Fresh cached responses are returned without a request, and stale ones with an ETag or Last-Modified are revalidated
+    with a conditional request.
+    """
+
+    def __init__(self, headers=None, cache=None):
+        self.settings_manager = SettingsManager()
+        self.timeout = (
+            self.settings_manager.get_setting("http_connect_timeout", 3.05),
+            self.settings_manager.get_setting("http_read_timeout", 10)
+        )
+        self.total_timeout = self.settings_manager.get_setting("http_total_timeout", 20)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        # Retry failed connections, which are safe to repeat, but not slow reads, which the timeouts already cover
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=Retry(total=2, connect=2, read=0,
+                                                                                    backoff_factor=0.2))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.cache = cache  # An HttpCache, False for no caching, or None for the cache set up in the settings
+        if cache is None and self.settings_manager.get_setting("http_cache_enabled", True):
+            self.cache = HttpCache(max_bytes=self.settings_manager.get_setting("http_cache_max_bytes", 20 * 1024 * 1024))
+
+    def get(self, url, max_bytes=None, reader=None):
+        """
+        Returns the response to a GET request as a CachedResponse, raising requests.RequestException on failure.
+
+        Bodies longer than max_bytes are cut off there and marked as truncated. A reader, an object with
+        start(url, headers) and feed(chunk) methods, is given the body as it arrives, to parse it while downloading.
+        """
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached.truncated and (max_bytes is None or max_bytes > len(cached.content)):
+            cached = None  # It was cut off shorter than the body now wanted
+        if cached and cached.is_fresh:
+            self.cache.record("hits", len(cached.content))
+            return self.replay(cached, max_bytes, reader)
+
+        headers = cached.validators if cached else {}
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and cached:
+                response.content  # Read the empty body, so the connection goes back to the pool instead of closing
+                return self.replay(self.cache.revalidated(url, cached, response.headers), max_bytes, reader)
+            response.raise_for_status()
+            if reader:
+                reader.start(response.url, response.headers)
+            chunks = []
+            size = 0
+            truncated = False
+            for chunk in self.stream_content(response):
+                if max_bytes is not None and size + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - size]
+                    truncated = True
+                chunks.append(chunk)
+                size += len(chunk)
+                if reader:
+                    reader.feed(chunk)
+                if truncated:
+                    break  # Leaving the with block closes the connection, rather than downloading the rest
+            content = b"".join(chunks)
+
+        if not self.cache:
+            return CachedResponse(response.url, dict(response.headers), content, expires=0, truncated=truncated)
+        self.cache.record("misses")
+        return self.cache.set(url, response.url, response.headers, content, truncated)
+
+    @staticmethod
+    def replay(cached, max_bytes, reader):
+        """Cuts a cached response down to max_bytes and gives it to the reader, as if it had just been downloaded."""
+        if max_bytes is not None and len(cached.content) > max_bytes:
+            cached.content = cached.content[:max_bytes]
+            cached.truncated = True
+        if reader:
+            reader.start(cached.url, cached.headers)
+            reader.feed(cached.content)
+        return cached
+
+    def stream_content(self, response):
+        """Yields a streamed response body as it arrives, raising requests.Timeout if it takes longer than the total
+        timeout. Uses read1, as iter_content waits for whole chunks and so never notices a trickling response."""
+        deadline = time.monotonic() + self.total_timeout
+        while True:
+            try:
+                chunk = response.raw.read1(CHUNK_SIZE, decode_content=True)
+            except ReadTimeoutError as e:
+                raise requests.Timeout(e)
+            except (ProtocolError, DecodeError) as e:
+                raise requests.ConnectionError(e)
+            if not chunk:
+                return
+            yield chunk
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"Reading {response.url} took longer than {self.total_timeout} seconds")
+
+    def stats(self):
+        """Returns the cache's counters, or None if caching is disabled."""
+        return self.cache.stats() if self.cache else None
@@ -0,0 +1,109 @@
+import threading
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+from utils.settings_manager import SettingsManager
+
+# One client of each kind is shared by every model in the process, so they share a pool of kept-alive connections
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_http_client = None
+_async_http_client = None
+_request_counts = {"sync": 0, "async": 0}
+
+
+def pool_limits():
+    """Returns the connection pool limits, tuned for a handful of long streaming requests running side by side."""
+    settings_manager = SettingsManager()
+    return httpx.Limits(
+        max_connections=settings_manager.get_setting("http_max_connections", 20),
+        max_keepalive_connections=settings_manager.get_setting("http_max_keepalive_connections", 10),
+        keepalive_expiry=settings_manager.get_setting("http_keepalive_expiry", 120)
+    )
+
+
+def client_options():
+    """Returns the options shared by the sync and async clients."""
+    settings_manager = SettingsManager()
+    return {
+        "api_key": settings_manager.get_setting("api_key"),
+        "base_url": settings_manager.get_setting("api_base_url"),  # None uses OPENAI_BASE_URL or the default API
+    }
+
+
+def get_client():
+    """Returns the process-wide OpenAI client, creating it on first use. It is safe to share between threads."""
+    global _client, _http_client
+    with _lock:
+        if _client is None:
+            _http_client = httpx.Client(
+                limits=pool_limits(),
+                event_hooks={"request": [lambda request: count_request("sync")]}
+            )
+            _client = OpenAI(http_client=_http_client, **client_options())
+        return _client
+
+
+def get_async_client():
+    """Returns the process-wide AsyncOpenAI client, creating it on first use.
+    Its connections belong to one event loop, so it must only be used from the ResponseGenerator's loop."""
+    global _async_client, _async_http_client
+    with _lock:
+        if _async_client is None:
+            async def on_request(request):
+                count_request("async")
+
+            _async_http_client = httpx.AsyncClient(limits=pool_limits(), event_hooks={"request": [on_request]})
+            _async_client = AsyncOpenAI(http_client=_async_http_client, **client_options())
+        return _async_client
+
+
+def count_request(kind):
+    with _lock:
+        _request_counts[kind] += 1
+
+
+def prewarm(connections=2):
+    """Opens connections to the API in the background, so the first TTS and transcription requests skip the TLS handshake."""
+    client = get_client()
+
+    def open_connection():
+        try:
+            # Any response will do, the point is to leave an open connection in the pool
+            _http_client.request("HEAD", str(client.base_url), timeout=10)
+        except httpx.HTTPError as e:
+            print(f"Error prewarming connection: {e}")
+
+    for _ in range(connections):
+        threading.Thread(target=open_connection, daemon=True).start()
+
+
+async def prewarm_async():
+    """Opens a connection for the async client. Must be awaited on the loop that will use the client."""
+    client = get_async_client()
+    try:
+        await _async_http_client.request("HEAD", str(client.base_url), timeout=10)
+    except httpx.HTTPError as e:
+        print(f"Error prewarming connection: {e}")
+
+
+def describe_pool(http_client):
+    """Returns the number of open and idle connections in an httpx client's pool."""
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    return {
+        "connections": len(connections),
+        "idle": sum(1 for connection in connections if connection.is_idle())
+    }
+
+
+def pool_stats():
+    """Returns request counts and connection pool usage for the shared clients."""
+    stats = {}
+    if _client is not None:
+        stats["sync"] = {"requests": _request_counts["sync"], **describe_pool(_http_client)}
+    if _async_client is not None:
+        stats["async"] = {"requests": _request_counts["async"], **describe_pool(_async_http_client)}
+    return stats
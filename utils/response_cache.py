@@ -0,0 +1,38 @@
+import re
+
+from utils.disk_cache import DiskCache, hash_key
+
+
+class ResponseCache:
+    """Caches the text of deterministic chat completions, keyed on the model, tools and normalised message history."""
+
+    def __init__(self, directory="cache/responses", max_bytes=5 * 1024 * 1024, ttl=24 * 60 * 60):
+        self.store = DiskCache(directory, max_bytes, ttl=ttl, suffix=".txt")
+
+    @staticmethod
+    def normalise_messages(messages):
+        """Drops empty fields and collapses whitespace, so trivially different histories share a key."""
+        normalised = []
+        for message in messages:
+            message = {key: value for key, value in message.items() if value is not None}
+            if isinstance(message.get("content"), str):
+                message["content"] = re.sub(r"\s+", " ", message["content"]).strip()
+            normalised.append(message)
+        return normalised
+
+    def key(self, model, tools, messages):
+        """Returns the cache key for a request."""
+        return hash_key(model, tools, self.normalise_messages(messages))
+
+    def get(self, key):
+        """Returns the cached response text for a key, or None on a miss."""
+        data = self.store.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def set(self, key, response):
+        """Stores the text of a response."""
+        self.store.set(key, response.encode("utf-8"))
+
+    def stats(self):
+        """Returns the hit and miss counters of the underlying store."""
+        return self.store.stats()
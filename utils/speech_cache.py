@@ -0,0 +1,36 @@
+import re
+import unicodedata
+
+from utils.disk_cache import DiskCache, hash_key
+
+
+class SpeechCache:
+    """Caches synthesized speech, keyed on the model, voice, audio format and normalised text of a sentence."""
+
+    def __init__(self, directory="cache/speech", max_bytes=50 * 1024 * 1024, max_characters=200):
+        self.store = DiskCache(directory, max_bytes, suffix=".pcm")
+        self.max_characters = max_characters  # Longer sentences are rarely repeated, so aren't worth the space
+
+    @staticmethod
+    def normalise_text(text):
+        """Collapses whitespace and unicode variants, so trivially different sentences share a key."""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+    def key(self, model, voice, text, response_format):
+        """Returns the cache key for a sentence, or None if it is too long to cache."""
+        text = self.normalise_text(text)
+        if len(text) > self.max_characters:
+            return None
+        return hash_key(model, voice, text, response_format)
+
+    def get(self, key):
+        """Returns the cached audio for a key, or None on a miss."""
+        return self.store.get(key)
+
+    def set(self, key, audio):
+        """Stores the audio of a sentence."""
+        self.store.set(key, audio)
+
+    def stats(self):
+        """Returns the hit and miss counters of the underlying store."""
+        return self.store.stats()
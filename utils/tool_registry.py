@@ -0,0 +1,113 @@
+import importlib
+import inspect
+import json
+import threading
+import types
+import typing
+from typing import Annotated
+
+from utils.tool_results import ToolResultShaper
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def tool(description, budget=None):
+    """Marks a function or method as a tool the assistant can call. The schema is generated from its signature,
+    with parameter descriptions given as typing.Annotated metadata. The budget is the most tokens a single result
+    may use before it is split into pages, or None for the registry's default."""
+    def decorator(function):
+        function.tool_description = description
+        function.tool_budget = budget
+        return function
+    return decorator
+
+
+class LazyIntegration:
+    """Imports and constructs an integration the first time it is used, so unused integrations cost nothing at startup."""
+
+    def __init__(self, module_name, class_name, *args, **kwargs):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.args = args
+        self.kwargs = kwargs
+        self.instance = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Returns the integration, importing and constructing it if this is the first use."""
+        if self.instance is None:
+            with self.lock:
+                if self.instance is None:
+                    module = importlib.import_module(self.module_name)
+                    self.instance = getattr(module, self.class_name)(*self.args, **self.kwargs)
+        return self.instance
+
+
+class ToolRegistry:
+    """Holds the tools the assistant can call, their JSON schemas and their handlers. Results are shaped into compact
+    JSON within each tool's token budget, and get_more_results is always registered to page through longer ones."""
+
+    def __init__(self, default_budget=1000):
+        self.handlers = {}
+        self.budgets = {}
+        self.schemas = []
+        self.shaper = ToolResultShaper(default_budget)
+        self.register(self.get_more_results)
+
+    def register(self, function, name=None, description=None):
+        """Registers a function as a tool, generating its schema from its signature."""
+        name = name or function.__name__
+        description = description or getattr(function, "tool_description", None) or inspect.getdoc(function) or ""
+        self.handlers[name] = function
+        self.budgets[name] = getattr(function, "tool_budget", None)
+        self.schemas.append({
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": self.build_parameters(function)
+            }
+        })
+
+    def register_all(self, source):
+        """Registers every function of a module, or method of an object, that is marked with @tool, in definition order."""
+        namespace = vars(source) if isinstance(source, types.ModuleType) else vars(type(source))
+        for attribute_name, member in namespace.items():
+            if hasattr(member, "tool_description"):
+                self.register(getattr(source, attribute_name))
+
+    @staticmethod
+    def build_parameters(function):
+        """Builds the JSON schema of a function's parameters from its signature and type hints."""
+        hints = typing.get_type_hints(function, include_extras=True)
+        properties = {}
+        required = []
+        for parameter in inspect.signature(function).parameters.values():
+            hint = hints.get(parameter.name, str)
+            metadata = []
+            if typing.get_origin(hint) is typing.Annotated:
+                hint, *metadata = typing.get_args(hint)
+            properties[parameter.name] = {"type": JSON_TYPES.get(typing.get_origin(hint) or hint, "string")}
+            if metadata:
+                properties[parameter.name]["description"] = " ".join(str(item) for item in metadata)
+            if parameter.default is inspect.Parameter.empty:
+                required.append(parameter.name)
+        return {"type": "object", "properties": properties, "required": required}
+
+    def call(self, name, arg_string):
+        """Calls a tool with its JSON arguments and returns the result as a string, shaped to fit the tool's budget."""
+        try:
+            handler = self.handlers.get(name)
+            if handler is None:
+                return f"Unknown function: {name}"
+            result = handler(**json.loads(arg_string or "{}"))
+            if handler == self.get_more_results:
+                return result  # Pages were already shaped to fit their tool's budget
+            return self.shaper.shape(name, result, self.budgets.get(name))
+        except Exception as e:
+            return str(e)
+
+    @tool("Returns another page of a tool result that was too long to return at once.")
+    def get_more_results(self, handle: Annotated[str, "The handle given with the previous page"],
+                         page: Annotated[int, "The page number to return"]):
+        return self.shaper.page(handle, page)
@@ -0,0 +1,162 @@
+import itertools
+import json
+import re
+import threading
+from collections import OrderedDict
+
+CHARS_PER_TOKEN = 4  # The same rough estimate the message history uses
+PAGE_OVERHEAD = 100  # Characters left for the page numbers and handle around each page
+BOILERPLATE_LINE = re.compile(
+    r"^\s*(>.*|skip to (main )?content|accept( all)? cookies.*|we use cookies.*|sign in|log in|subscribe|"
+    r"share (this|on) .*|advertisement|back to top|all rights reserved.*|©.*)\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+REPEATED_SPACE = re.compile(r"[ \t ]+")
+REPEATED_NEWLINES = re.compile(r"\n\s*\n+")
+
+
+def compact_json(value):
+    """Serialises a value as JSON without spaces or ASCII escapes, which costs fewer tokens than a Python repr."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def clean_text(text):
+    """Removes boilerplate lines, such as cookie banners and quoted email replies, and collapses whitespace."""
+    text = BOILERPLATE_LINE.sub("", text)
+    text = REPEATED_SPACE.sub(" ", text)
+    return REPEATED_NEWLINES.sub("\n", text).strip()
+
+
+def clean(value):
+    """Cleans every string in a result, and drops duplicate and non-navigable links from lists of links."""
+    if isinstance(value, str):
+        return clean_text(value)
+    if isinstance(value, dict):
+        return {key: clean(item) for key, item in value.items() if item not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        items = [clean(item) for item in value]
+        if items and all(isinstance(item, dict) and "url" in item for item in items):
+            items = dedupe_links(items)
+        return items
+    return value
+
+
+def dedupe_links(links):
+    """Keeps the first link to each URL, dropping fragments, javascript: and mailto: links."""
+    seen = set()
+    unique = []
+    for link in links:
+        url = str(link.get("url", "")).split("#")[0]
+        if not url or url.startswith(("javascript:", "mailto:")) or url in seen:
+            continue
+        seen.add(url)
+        unique.append({**link, "url": url})
+    return unique
+
+
+class ToolResultShaper:
+    """
+    Turns tool results into compact JSON within a token budget.
+
+    Results are cleaned, then serialised. If one is over its tool's budget, it is split into pages that fit: lists
+    between items, dicts between parts of their longest string and anything else between words. Only the first page
+    is returned, with a handle the model can pass to get_more_results for the rest. Only the most recent `max_stored`
+    paged results are kept.
+    """
+
+    def __init__(self, default_budget=1000, max_stored=20):
+        self.default_budget = default_budget  # In tokens
+        self.max_stored = max_stored
+        self.pages = OrderedDict()  # Handle to the pages of a result, least recently used first
+        self.handles = itertools.count(1)
+        self.lock = threading.Lock()  # Tools run concurrently in the tool pool
+
+    def shape(self, name, result, budget=None):
+        """Returns a tool's result as a string within the budget, in tokens, or the first page of it."""
+        budget_chars = (budget or self.default_budget) * CHARS_PER_TOKEN
+        if result is None:
+            return ""
+        result = clean(result)
+        text = result if isinstance(result, str) else compact_json(result)
+        if len(text) <= budget_chars:
+            return text
+
+        page_chars = max(budget_chars - PAGE_OVERHEAD, PAGE_OVERHEAD)
+        if isinstance(result, list):
+            pages = self.split_items(result, page_chars)
+        elif isinstance(result, dict):
+            pages = self.split_item(result, page_chars)
+        else:
+            pages = self.split_text(text, page_chars)
+        with self.lock:
+            handle = f"{name}-{next(self.handles)}"
+            self.pages[handle] = pages
+            while len(self.pages) > self.max_stored:
+                self.pages.popitem(last=False)
+        return self.page(handle, 1)
+
+    def page(self, handle, page):
+        """Returns one page of a stored result, with the handle and page number to ask for the next one."""
+        with self.lock:
+            pages = self.pages.get(handle)
+            if pages is None:
+                return f"No stored results for {handle}, call the tool again instead."
+            self.pages.move_to_end(handle)
+        if not 1 <= page <= len(pages):
+            return f"{handle} has pages 1 to {len(pages)}."
+        response = {"page": page, "pages": len(pages), "content": pages[page - 1]}
+        if page < len(pages):
+            response["more"] = {"handle": handle, "page": page + 1}
+        return compact_json(response)
+
+    @staticmethod
+    def split_items(items, budget_chars):
+        """Splits a list into pages of whole items that fit the budget, splitting any item that is too big on its own
+        into parts on consecutive pages."""
+        pages = [[]]
+        size = 0
+        for item in items:
+            parts = [item] if len(compact_json(item)) < budget_chars else ToolResultShaper.split_item(item, budget_chars)
+            for part in parts:
+                part_size = len(compact_json(part)) + 1
+                if pages[-1] and size + part_size > budget_chars:
+                    pages.append([])
+                    size = 0
+                pages[-1].append(part)
+                size += part_size
+        return pages
+
+    @staticmethod
+    def split_item(item, budget_chars):
+        """
+        Splits an item into parts that each fit the budget.
+
+        A dict has its longest string, such as an email's content, split between the parts. Each part keeps the other
+        fields, and has a "part" field numbering it, such as "2/3". Anything else is split as text.
+        """
+        strings = [key for key, value in item.items() if isinstance(value, str)] if isinstance(item, dict) else []
+        if strings:
+            field = max(strings, key=lambda key: len(item[key]))
+            value = item[field]
+            other_size = len(compact_json({**item, field: "", "part": "00/00"}))
+            # Escaped quotes and newlines make the serialised text longer than the string itself
+            expansion = (len(compact_json(value)) - 2) / max(len(value), 1)
+            if other_size < budget_chars // 2:
+                pieces = ToolResultShaper.split_text(value, int((budget_chars - other_size) / max(expansion, 1)))
+                return [{**item, field: piece, "part": f"{index}/{len(pieces)}"}
+                        for index, piece in enumerate(pieces, start=1)]
+        text = item if isinstance(item, str) else compact_json(item)
+        return ToolResultShaper.split_text(text, budget_chars)
+
+    @staticmethod
+    def split_text(text, budget_chars):
+        """Splits text into pages that fit the budget, between words where possible."""
+        budget_chars = max(budget_chars, 1)
+        pages = []
+        while len(text) > budget_chars:
+            end = text.rfind(" ", budget_chars // 2, budget_chars)
+            end = end if end != -1 else budget_chars
+            pages.append(text[:end])
+            text = text[end:].lstrip()
+        pages.append(text)
+        return pages
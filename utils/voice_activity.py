@@ -0,0 +1,84 @@
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """
+    Finds where speech starts and ends in a stream of samples, from the RMS volume of short frames.
+
+    Frames louder than `speech_threshold` are speech, and frames quieter than `silence_threshold` are silence.
+    Recordings run on `hangover` seconds after the last speech frame, so trailing sounds aren't clipped, and start
+    `pre_roll` seconds before the first speech frame, so quiet onsets aren't clipped. The hangover only widens the
+    recording, it doesn't delay noticing that speech has ended.
+    """
+
+    def __init__(self, samplerate, frame_duration=0.03, speech_threshold=0.01, silence_threshold=0.01, hangover=0.3,
+                 pre_roll=0.3):
+        self.samplerate = samplerate
+        self.frame_length = max(1, int(samplerate * frame_duration))
+        self.speech_threshold = speech_threshold
+        self.silence_threshold = silence_threshold
+        self.hangover = int(samplerate * hangover)  # In samples
+        self.pre_roll = int(samplerate * pre_roll)  # In samples
+        self.reset()
+
+    def reset(self):
+        """Clears the detector, ready for a new stream."""
+        self.position = 0  # Samples processed
+        self.speech_start = None  # Position of the first speech frame, or None if there has been no speech
+        self.speech_end = None  # Position after the last speech frame
+        self.silence_samples = 0  # Samples of silence frames since the last speech frame
+
+    def process(self, samples):
+        """Processes the whole frames at the start of some samples, following on from the last call, and returns the
+        number of samples used. The rest should be passed again with the next samples."""
+        frame_count = len(samples) // self.frame_length
+        if not frame_count:
+            return 0
+        used = frame_count * self.frame_length
+        frames = samples[:used].reshape(frame_count, self.frame_length)
+        volumes = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        speech = np.flatnonzero(volumes > self.speech_threshold)
+        silence = volumes < self.silence_threshold
+
+        if len(speech):
+            if self.speech_start is None:
+                self.speech_start = self.position + int(speech[0]) * self.frame_length
+            last = int(speech[-1]) + 1
+            self.speech_end = self.position + last * self.frame_length
+            self.silence_samples = int(np.count_nonzero(silence[last:])) * self.frame_length
+        elif self.speech_start is not None:
+            self.silence_samples += int(np.count_nonzero(silence)) * self.frame_length
+        self.position += used
+        return used
+
+    @property
+    def speech_detected(self):
+        return self.speech_start is not None
+
+    @property
+    def trailing_silence(self):
+        """Seconds of silence since speech was last heard."""
+        if self.speech_start is None:
+            return 0.0
+        return self.silence_samples / self.samplerate
+
+    @property
+    def silence_after_hangover(self):
+        """Seconds of silence after the end of the hangover, used to cut segments only at pauses longer than it."""
+        if self.speech_start is None:
+            return 0.0
+        return max(0, self.silence_samples - self.hangover) / self.samplerate
+
+    @property
+    def speech_duration(self):
+        """Seconds from the start of speech to the end of the last speech frame."""
+        if self.speech_start is None:
+            return 0.0
+        return (self.speech_end - self.speech_start) / self.samplerate
+
+    def recording_bounds(self):
+        """Returns the start and end positions of the speech, including the pre-roll and hangover, or None if there has
+        been no speech."""
+        if self.speech_start is None:
+            return None
+        return max(0, self.speech_start - self.pre_roll), min(self.position, self.speech_end + self.hangover)
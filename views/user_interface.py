@@ -1,7 +1,7 @@
-import winsound
 from PyQt5.QtCore import Qt, QTimer, QSize, Q_ARG
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QWidget, QMainWindow, QLineEdit, QPushButton, \
-    QHBoxLayout, QListWidget, QListWidgetItem, QSpacerItem, QSizePolicy
+    QHBoxLayout, QListWidget, QListWidgetItem, QSpacerItem, QSizePolicy, QShortcut
 
 from enums import *
 from utils.settings_manager import SettingsManager
@@ -42,7 +42,15 @@ class MainWindow(QMainWindow):
         button_size = 30
         self.chatButton.setFixedSize(button_size, button_size)
 
+        # Stop button, only shown while the assistant is generating or speaking
+        self.stopButton = QPushButton("■")
+        self.stopButton.setFixedSize(button_size, button_size)
+        self.stopButton.setVisible(False)
+        self.stopButton.clicked.connect(self.controller.cancel)
+        self.inputLayout.addWidget(self.stopButton, 0, Qt.AlignRight)
+
         self.inputLayout.addWidget(self.chatButton, 0, Qt.AlignRight)
+        QShortcut(QKeySequence(Qt.Key_Escape), self, activated=self.controller.cancel)
         self.layout.addLayout(self.inputLayout)
         self.centralWidget.setLayout(self.layout)
 